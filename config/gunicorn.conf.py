@@ -0,0 +1,20 @@
+"""
+Gunicorn configuration for production deployments
+
+Usage (from the project root):
+    gunicorn -c config/gunicorn.conf.py --chdir src app.app:app
+"""
+import os
+import multiprocessing
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+
+# Import the app once in the master and fork workers from it, so module-level
+# state (config, JSON provider, HTTP sessions) is shared copy-on-write
+preload_app = True
+
+# Keep idle client connections open behind the reverse proxy
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
@@ -104,7 +104,14 @@ case "$1" in
         print_status "Starting production server..."
         export PYTHONPATH="${PWD}/src:${PYTHONPATH}"
         export FLASK_ENV=production
-        cd src/app && python app.py
+        gunicorn -c config/gunicorn.conf.py --chdir src app.app:app
+        ;;
+    
+    "config-cache")
+        print_status "Compiling .env into src/config/_compiled_env.py..."
+        export PYTHONPATH="${PWD}/src:${PYTHONPATH}"
+        python -m config.env_cache
+        print_success "Config cache written (used when FLASK_ENV=production)"
         ;;
     
     "clean")
@@ -145,6 +152,7 @@ case "$1" in
         echo "  install        - Install dependencies"
         echo "  run            - Start development server"
         echo "  run-prod       - Start production server"
+        echo "  config-cache   - Compile .env for production workers"
         echo "  test           - Run all tests with coverage"
         echo "  test-unit      - Run unit tests only"
         echo "  test-integration - Run integration tests only"
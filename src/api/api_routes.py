@@ -1,15 +1,35 @@
-import datetime
-from flask import Blueprint, request, jsonify
+import time
+from flask import Blueprint, jsonify, g
 from auth.auth_utils import login_required_api, login_required_cookie
 
 # Create API Blueprint
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+# Static payload for /api/data, built once at import
+_DATA_ITEMS = (
+    {'id': 1, 'name': 'Item 1', 'description': 'First item'},
+    {'id': 2, 'name': 'Item 2', 'description': 'Second item'},
+    {'id': 3, 'name': 'Item 3', 'description': 'Third item'}
+)
+
+# (epoch second, ISO-8601 string) - reformatted only when the second changes
+_timestamp_cache = (0, '')
+
+def _utc_timestamp():
+    """Current UTC time as an ISO-8601 string, cached per second"""
+    global _timestamp_cache
+    now = int(time.time())
+    second, formatted = _timestamp_cache
+    if second != now:
+        formatted = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(now))
+        _timestamp_cache = (now, formatted)
+    return formatted
+
 @api_bp.route('/get-auth-token')
 @login_required_cookie
 def api_get_auth_token(user):
     """API endpoint to get current user's JWT token for frontend use"""
-    token = request.cookies.get('auth_token')
+    token = g.auth_token
     return jsonify({'token': token})
 
 @api_bp.route('/profile')
@@ -30,7 +50,7 @@ def api_protected(user):
     return jsonify({
         'message': 'This is a protected API endpoint',
         'user': user.get('email'),
-        'timestamp': datetime.datetime.utcnow().isoformat()
+        'timestamp': _utc_timestamp()
     })
 
 @api_bp.route('/data')
@@ -38,10 +58,6 @@ def api_protected(user):
 def api_data(user):
     """Example API endpoint that returns some data - requires Bearer token"""
     return jsonify({
-        'data': [
-            {'id': 1, 'name': 'Item 1', 'description': 'First item'},
-            {'id': 2, 'name': 'Item 2', 'description': 'Second item'},
-            {'id': 3, 'name': 'Item 3', 'description': 'Third item'}
-        ],
+        'data': _DATA_ITEMS,
         'user': user.get('email')
     })
@@ -2,34 +2,113 @@ import os
 import sys
 import jwt
 import datetime
-from flask import Flask, render_template, request, jsonify, redirect, url_for, make_response, session
+import orjson
+from flask import Flask, render_template, request, jsonify, redirect, url_for, make_response, g, after_this_request
+from flask.json.provider import DefaultJSONProvider
+from flask.sessions import SecureCookieSessionInterface
+from itsdangerous import URLSafeTimedSerializer, BadSignature
 from authlib.integrations.flask_client import OAuth
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from urllib.parse import urlencode
 
 # Add src to Python path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 from config.config import config
-from auth.auth_utils import generate_jwt_token, get_user_from_cookie, login_required_cookie
+from auth.auth_utils import generate_jwt_token, get_user_from_cookie, login_required_cookie, is_asymmetric_algorithm, init_auth
 from api.api_routes import api_bp
-from kong.kong_admin_api import KongAdminAPI, KongAdminAPIError
+from kong.kong_admin_api import KongAdminAPIError, get_kong_api
+from kong.kong_cache import ConsumerCache
+from kong.kong_utils import email_to_kong_username
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider that serializes with orjson, falling back to Flask's defaults for other types"""
+    
+    _options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self._options).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+class StatelessAPISessionInterface(SecureCookieSessionInterface):
+    """Cookie sessions for web routes; API, static and landing page requests never load or sign a session cookie"""
+    
+    # Matched on the path because the session is opened before URL routing
+    stateless_prefixes = ('/api/', '/static/')
+    stateless_paths = frozenset({'/'})
+    
+    def open_session(self, app, request):
+        path = request.path
+        if path in self.stateless_paths or path.startswith(self.stateless_prefixes):
+            return None  # Flask substitutes a NullSession and skips save_session
+        return super().open_session(app, request)
 
 app = Flask(__name__, 
            template_folder='../templates',
            static_folder='../static')
+app.json = OrjsonProvider(app)
+app.session_interface = StatelessAPISessionInterface()
 
 # Load configuration
 config_name = os.getenv('FLASK_ENV', 'default')
 app.config.from_object(config[config_name])
+init_auth(app)
+
+# OAuth settings used on every login, read once now that the config is loaded
+GOOGLE_CLIENT_ID = app.config['GOOGLE_CLIENT_ID']
+GOOGLE_CLIENT_SECRET = app.config['GOOGLE_CLIENT_SECRET']
+GOOGLE_TOKEN_URL = app.config['GOOGLE_TOKEN_URL']
+GOOGLE_USERINFO_URL = app.config['GOOGLE_USERINFO_URL']
+SECURE_COOKIES = app.config['ENV'] == 'production'
+
+# Attributes of the JWT cookie set after login - fixed per deployment
+AUTH_COOKIE = 'auth_token'
+AUTH_COOKIE_OPTIONS = {
+    'httponly': True,
+    'secure': SECURE_COOKIES,
+    'samesite': 'Lax',
+    'max_age': 24*60*60  # 24 hours
+}
 
 # Register API Blueprint
 app.register_blueprint(api_bp)
 
 # Initialize Kong Admin API
 kong_admin_url = app.config.get('KONG_ADMIN_URL', 'http://localhost:8001')
-kong_api = KongAdminAPI(kong_admin_url)
+kong_api = get_kong_api(
+    kong_admin_url,
+    pool_maxsize=app.config.get('KONG_ADMIN_POOL_MAXSIZE'),
+    max_concurrency=app.config.get('KONG_ADMIN_CONCURRENCY')
+)
+app.extensions['kong_api'] = kong_api
+
+# Kong provisioning runs in the background so logins don't wait on the Admin API
+kong_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='kong-provision')
+# Provisioning tasks in flight, keyed by email, so repeat triggers don't queue duplicates
+kong_provisioning = {}
+kong_provisioning_lock = threading.Lock()
+
+# Separate pool for Admin API calls overlapped within a provisioning task (avoids nested waits on kong_executor)
+kong_lookup_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='kong-lookup')
+
+# Kong consumer IDs resolved by this process, keyed by email (served stale if Kong is down)
+kong_consumer_cache = ConsumerCache()
+
+# Pooled HTTP session for Google OAuth calls - keeps TLS connections alive across logins
+oauth_http = requests.Session()
+oauth_http.mount('https://', HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=50,
+    max_retries=Retry(total=2, backoff_factor=0.1)  # Connection resets; POSTs are only retried before they are sent
+))
 
 # OAuth Configuration
 oauth = OAuth(app)
@@ -46,6 +125,73 @@ google = oauth.register(
     }
 )
 
+def check_oauth_redirect_uri(config):
+    """
+    Refuse to start outside debug mode without a fixed OAUTH_REDIRECT_URI.
+    
+    Without it the redirect URI is built from the request's Host header, which
+    clients control, so it is only acceptable for local development.
+    """
+    if not config.get('OAUTH_REDIRECT_URI') and not config.get('DEBUG'):
+        raise RuntimeError('OAUTH_REDIRECT_URI must be set when DEBUG is off')
+
+check_oauth_redirect_uri(app.config)
+
+# OAuth redirect URI - constant per deployment (None only in debug setups)
+OAUTH_REDIRECT_URI = app.config.get('OAUTH_REDIRECT_URI')
+
+def get_callback_url():
+    """Return the configured OAuth redirect URI, or build it from the current request in debug setups"""
+    if OAUTH_REDIRECT_URI:
+        return OAUTH_REDIRECT_URI
+    # Per request, never cached - the Host header differs between (and is chosen by) clients
+    return url_for('callback', _external=True)
+
+@lru_cache(maxsize=1)
+def build_auth_url_base(redirect_uri):
+    """
+    Return the Google authorization URL for redirect_uri up to the state parameter.
+    
+    Keyed by the redirect URI, so a configured OAUTH_REDIRECT_URI is urlencoded
+    once while debug setups never reuse a URL built for another request's host.
+    """
+    auth_params = {
+        'client_id': GOOGLE_CLIENT_ID,
+        'redirect_uri': redirect_uri,
+        'scope': 'openid email profile',
+        'response_type': 'code',
+        'access_type': 'offline',
+        'prompt': 'consent'
+    }
+    return app.config['GOOGLE_DISCOVERY_URL'] + '?' + urlencode(auth_params) + '&state='
+
+def get_auth_url_base():
+    """Return the fixed part of the Google authorization URL - only the state changes per login"""
+    return build_auth_url_base(get_callback_url())
+
+# OAuth CSRF state lives in its own short-lived signed cookie instead of the session
+OAUTH_STATE_COOKIE = 'oauth_state'
+OAUTH_STATE_MAX_AGE = 600  # 10 minutes to complete the Google consent screen
+OAUTH_STATE_PATH = '/callback'  # Only the callback reads it, so other requests don't carry it
+
+def get_state_serializer():
+    """Serializer for the OAuth state cookie, signed with the app secret key"""
+    return URLSafeTimedSerializer(app.secret_key, salt='oauth-state')
+
+def sign_oauth_state(state):
+    """Sign a state nonce for the OAuth state cookie"""
+    return get_state_serializer().dumps(state)
+
+def load_oauth_state():
+    """Return the state nonce from the OAuth state cookie, or None if missing, tampered or expired"""
+    signed_state = request.cookies.get(OAUTH_STATE_COOKIE)
+    if not signed_state:
+        return None
+    try:
+        return get_state_serializer().loads(signed_state, max_age=OAUTH_STATE_MAX_AGE)
+    except BadSignature:
+        return None
+
 # Routes
 @app.route('/')
 def index():
@@ -56,29 +202,35 @@ def index():
 @app.route('/login')
 def login():
     """Initiate Google OAuth login"""
-    # Generate a random state parameter for CSRF protection
-    state = secrets.token_urlsafe(32)
-    session['oauth_state'] = state
+    # Generate a random state parameter for CSRF protection (128 bits)
+    state = secrets.token_urlsafe(16)
     
-    # Build authorization URL
-    auth_params = {
-        'client_id': app.config['GOOGLE_CLIENT_ID'],
-        'redirect_uri': url_for('callback', _external=True),
-        'scope': 'openid email profile',
-        'response_type': 'code',
-        'state': state,
-        'access_type': 'offline',
-        'prompt': 'consent'
-    }
-    
-    auth_url = app.config['GOOGLE_DISCOVERY_URL'] + '?' + urlencode(auth_params)
-    return redirect(auth_url)
+    # Build authorization URL (token_urlsafe output needs no further escaping)
+    auth_url = get_auth_url_base() + state
+    response = redirect(auth_url)
+    response.set_cookie(
+        OAUTH_STATE_COOKIE,
+        sign_oauth_state(state),
+        httponly=True,
+        secure=SECURE_COOKIES,
+        samesite='Lax',
+        max_age=OAUTH_STATE_MAX_AGE,
+        path=OAUTH_STATE_PATH
+    )
+    return response
 
 @app.route('/callback')
 def callback():
     """Handle Google OAuth callback"""
+    # The state nonce is single-use, so clear it whether the login succeeds or not
+    @after_this_request
+    def clear_oauth_state(response):
+        response.delete_cookie(OAUTH_STATE_COOKIE, path=OAUTH_STATE_PATH)
+        return response
+    
     # Verify state parameter
-    if request.args.get('state') != session.get('oauth_state'):
+    expected_state = load_oauth_state()
+    if expected_state is None or request.args.get('state') != expected_state:
         return render_template('error.html', error='Invalid state parameter'), 400
     
     # Get authorization code
@@ -88,50 +240,40 @@ def callback():
     
     # Exchange code for token
     token_data = {
-        'client_id': app.config['GOOGLE_CLIENT_ID'],
-        'client_secret': app.config['GOOGLE_CLIENT_SECRET'],
+        'client_id': GOOGLE_CLIENT_ID,
+        'client_secret': GOOGLE_CLIENT_SECRET,
         'code': code,
         'grant_type': 'authorization_code',
-        'redirect_uri': url_for('callback', _external=True)
+        'redirect_uri': get_callback_url()
     }
     
     try:
-        token_response = requests.post(app.config['GOOGLE_TOKEN_URL'], data=token_data)
+        token_response = oauth_http.post(GOOGLE_TOKEN_URL, data=token_data)
         token_response.raise_for_status()
         token_info = token_response.json()
         
-        # Get user info
-        headers = {'Authorization': f'Bearer {token_info["access_token"]}'}
-        user_response = requests.get(app.config['GOOGLE_USERINFO_URL'], headers=headers)
-        user_response.raise_for_status()
-        user_info = user_response.json()
+        # With the openid/email/profile scopes the id_token already carries the profile,
+        # so the userinfo request is only needed when Google didn't return one
+        claims = get_id_token_claims(token_info)
+        if claims.get('sub') and claims.get('email'):
+            user_data = {
+                'sub': claims['sub'],
+                'email': claims['email'],
+                'name': claims.get('name'),
+                'picture': claims.get('picture')
+            }
+        else:
+            user_data = fetch_google_userinfo(token_info['access_token'])
         
-        # Create or ensure Kong consumer exists for this user
-        kong_consumer_id = create_or_get_kong_consumer(user_info['email'])
+        # Create or ensure Kong consumer exists for this user (not needed for the JWT)
+        schedule_kong_provisioning(user_data['email'])
 
         # Create JWT token
-        user_data = {
-            'sub': user_info['id'],
-            'email': user_info['email'],
-            'name': user_info['name'],
-            'picture': user_info.get('picture')
-        }
-        
         jwt_token = generate_jwt_token(user_data)
         
         # Set cookie and redirect
         response = make_response(redirect(url_for('dashboard')))
-        response.set_cookie(
-            'auth_token',
-            jwt_token,
-            httponly=True,
-            secure=app.config['ENV'] == 'production',
-            samesite='Lax',
-            max_age=24*60*60  # 24 hours
-        )
-        
-        # Clean up session
-        session.pop('oauth_state', None)
+        response.set_cookie(AUTH_COOKIE, jwt_token, **AUTH_COOKIE_OPTIONS)
         
         return response
         
@@ -151,7 +293,11 @@ def logout():
 @login_required_cookie
 def dashboard(user):
     """Dashboard page - requires authentication via cookie"""
-    token = request.cookies.get('auth_token')
+    # Finish Kong provisioning lazily if the login-time background task hasn't succeeded
+    if kong_consumer_cache.peek(user['email']) is None:
+        schedule_kong_provisioning(user['email'])
+    
+    token = g.auth_token
     return render_template('dashboard.html', user=user, auth_token=token)
 
 # Utility endpoint to get JWT token for API testing
@@ -159,21 +305,129 @@ def dashboard(user):
 @login_required_cookie
 def get_token(user):
     """Get JWT token for API testing (web UI only)"""
-    token = request.cookies.get('auth_token')
+    token = g.auth_token
     return render_template('token.html', token=token, user=user)
 
 # Error handlers
+# Static error pages, rendered once per (code, message) and then served as-is.
+# Rendered lazily because the templates need a request context for url_for.
+error_pages = {}
+
+def render_error_page(error_code, error_message):
+    """Return the rendered error page, rendering it on first use"""
+    key = (error_code, error_message)
+    page = error_pages.get(key)
+    if page is None:
+        page = error_pages[key] = render_template('error.html', error_code=error_code, error_message=error_message)
+    return page
+
 @app.errorhandler(404)
 def not_found(error):
-    return render_template('error.html', error_code=404, error_message='Page not found'), 404
+    return render_error_page(404, 'Page not found'), 404
 
 @app.errorhandler(500)
 def internal_error(error):
-    return render_template('error.html', error_code=500, error_message='Internal server error'), 500
+    return render_error_page(500, 'Internal server error'), 500
+
+def get_id_token_claims(token_info):
+    """
+    Read the claims of the id_token returned by Google's token endpoint.
+    
+    The token comes straight from Google over TLS in exchange for our client
+    secret, so its signature is not re-verified (OpenID Connect Core 3.1.3.7).
+    
+    Args:
+        token_info (dict): Token endpoint response
+        
+    Returns:
+        dict: id_token claims, or an empty dict if there is no usable id_token
+    """
+    id_token = token_info.get('id_token')
+    if not id_token:
+        return {}
+    try:
+        return jwt.decode(id_token, options={'verify_signature': False})
+    except jwt.InvalidTokenError:
+        return {}
+
+def fetch_google_userinfo(access_token):
+    """
+    Fetch the user's profile from Google's userinfo endpoint.
+    
+    Args:
+        access_token (str): OAuth access token from the token endpoint
+        
+    Returns:
+        dict: user data with sub, email, name and picture
+    """
+    headers = {'Authorization': f'Bearer {access_token}'}
+    user_response = oauth_http.get(GOOGLE_USERINFO_URL, headers=headers)
+    user_response.raise_for_status()
+    user_info = user_response.json()
+    return {
+        'sub': user_info['id'],
+        'email': user_info['email'],
+        'name': user_info['name'],
+        'picture': user_info.get('picture')
+    }
+
+def schedule_kong_provisioning(user_email):
+    """
+    Provision the user's Kong consumer on kong_executor unless a task for them is already running.
+    
+    Args:
+        user_email (str): User's email address
+    """
+    with kong_provisioning_lock:
+        future = kong_provisioning.get(user_email)
+        if future is not None and not future.done():
+            return
+        future = kong_provisioning[user_email] = kong_executor.submit(create_or_get_kong_consumer, user_email)
+    
+    def forget(done_future):
+        with kong_provisioning_lock:
+            if kong_provisioning.get(user_email) is done_future:
+                del kong_provisioning[user_email]
+    
+    # Registered outside the lock - it runs immediately if the task already finished
+    future.add_done_callback(forget)
 
 def create_or_get_kong_consumer(user_email):
     """
-    Create or retrieve Kong consumer for a user.
+    Create or retrieve Kong consumer for a user, using the consumer cache.
+    
+    Args:
+        user_email (str): User's email address
+        
+    Returns:
+        str or None: Kong consumer ID if successful, None if failed
+    """
+    return kong_consumer_cache.get_or_set(user_email, lambda: provision_kong_consumer(user_email))
+
+def has_credential(listing_future, user_email, kind):
+    """
+    Return whether a credential listing started by provision_kong_consumer found any credential.
+    
+    Args:
+        listing_future (Future): Pending get_consumer_jwts call (size=1)
+        user_email (str): User's email address
+        kind (str): Credential description for log messages
+        
+    Returns:
+        bool: True if a credential exists or the listing failed for a reason other than 404
+    """
+    try:
+        listing, _ = listing_future.result()
+        return bool(listing.get('data'))
+    except KongAdminAPIError as e:
+        if e.status_code == 404:
+            return False  # Listed before the consumer was created
+        app.logger.warning("Failed to list %s for user %s: %s", kind, user_email, e.message)
+        return True  # Don't risk issuing duplicate credentials
+
+def provision_kong_consumer(user_email):
+    """
+    Create the Kong consumer for a user if needed, with an API key on creation and any missing jwt credential.
     
     Args:
         user_email (str): User's email address
@@ -183,54 +437,59 @@ def create_or_get_kong_consumer(user_email):
     """
     try:
         # Create username from email (remove @ and special chars for Kong compatibility)
-        kong_username_sanitized = user_email.split('@')[0].replace('.', '_').replace('+', '_')
-        
-        # Check if consumer already exists (using email as username)
-        try:
-            existing_consumer, status = kong_api.get_consumer(user_email)
-            if status == 200:
-                app.logger.info(f"Kong consumer already exists for user: {user_email}")
-                return existing_consumer['id']
-            else:
-                # This shouldn't happen if get_consumer worked, but handle it
-                raise KongAdminAPIError("Unexpected status", status)
-                
-        except KongAdminAPIError as e:
-            if e.status_code == 404:
-                # Consumer doesn't exist, create it
-                app.logger.info(f"Creating Kong consumer for new user: {user_email}")
-                consumer_response, status = kong_api.create_consumer(
-                    username=user_email,  # Use email as username
-                    custom_id=kong_username_sanitized,  # Use sanitized username as custom_id
-                    tags=["free"]
-                )
-                
-                if status == 201:
-                    kong_consumer_id = consumer_response['id']
-                    app.logger.info(f"Successfully created Kong consumer {kong_consumer_id} for user: {user_email}")
-                    
-                    # Optionally create an API key for the user
-                    try:
-                        key_response, key_status = kong_api.create_consumer_key(user_email)
-                        if key_status == 201:
-                            app.logger.info(f"Created API key for user: {user_email}")
-                        else:
-                            app.logger.warning(f"Failed to create API key for user: {user_email} (status: {key_status})")
-                    except KongAdminAPIError as key_error:
-                        app.logger.warning(f"Failed to create API key for user {user_email}: {key_error.message}")
-                    
-                    return kong_consumer_id
+        kong_username_sanitized = email_to_kong_username(user_email)
+        
+        # Kong verifies asymmetric API tokens at the edge, so those consumers also need a jwt credential;
+        # list existing ones while the consumer is created or fetched
+        needs_jwt = is_asymmetric_algorithm(app.config['JWT_ALGORITHM'])
+        jwts_future = kong_lookup_executor.submit(kong_api.get_consumer_jwts, user_email, size=1) if needs_jwt else None
+        
+        # Existing consumers are returned as-is, so tier tags or custom_ids changed since signup survive logins
+        consumer_response, status = kong_api.ensure_consumer(
+            user_email,  # Use email as username
+            custom_id=kong_username_sanitized,  # Use sanitized username as custom_id
+            tags=["free"]
+        )
+        if status not in (200, 201):
+            app.logger.error("Failed to provision Kong consumer for user: %s (status: %s)", user_email, status)
+            return None
+        
+        kong_consumer_id = consumer_response['id']
+        app.logger.info("Kong consumer %s ready for user: %s", kong_consumer_id, user_email)
+        
+        # API keys are only issued on signup - a user who revoked theirs doesn't get one back on login
+        if status == 201:
+            try:
+                key_response, key_status = kong_api.create_consumer_key(user_email)
+                if key_status == 201:
+                    app.logger.info("Created API key for user: %s", user_email)
                 else:
-                    app.logger.error(f"Failed to create Kong consumer for user: {user_email} (status: {status})")
-                    return None
-            else:
-                # Some other error occurred
-                app.logger.error(f"Kong API error for user {user_email}: {e.message}")
-                return None
-                
+                    app.logger.warning("Failed to create API key for user: %s (status: %s)", user_email, key_status)
+            except KongAdminAPIError as key_error:
+                app.logger.warning("Failed to create API key for user %s: %s", user_email, key_error.message)
+        
+        # Checked separately from the API key, so consumers created before the jwt
+        # credential existed (or whose creation failed) get one on their next login
+        if needs_jwt and not has_credential(jwts_future, user_email, "JWT credentials"):
+            try:
+                kong_api.create_consumer_jwt(
+                    user_email,
+                    key=user_email,  # Matched against the token's iss claim
+                    algorithm=app.config['JWT_ALGORITHM'],
+                    rsa_public_key=app.config['JWT_PUBLIC_KEY']
+                )
+                app.logger.info("Created JWT credential for user: %s", user_email)
+            except KongAdminAPIError as jwt_error:
+                app.logger.warning("Failed to create JWT credential for user %s: %s", user_email, jwt_error.message)
+        
+        return kong_consumer_id
+    
+    except KongAdminAPIError as e:
+        app.logger.error("Kong API error for user %s: %s", user_email, e.message)
+        return None
     except Exception as e:
         # Don't fail the login if Kong operations fail
-        app.logger.error(f"Unexpected error creating Kong consumer for user {user_email}: {str(e)}")
+        app.logger.error("Unexpected error creating Kong consumer for user %s: %s", user_email, e)
         return None
 
 if __name__ == '__main__':
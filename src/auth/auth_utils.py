@@ -1,52 +1,299 @@
 import jwt
+import hmac
+import time
+import base64
+import hashlib
+import calendar
 import datetime
+import threading
+import orjson
+from collections import OrderedDict, namedtuple
 from functools import wraps
-from flask import request, jsonify, redirect, url_for, current_app
+from flask import request, jsonify, redirect, url_for, current_app, g
+
+# Verified JWT payloads keyed by (token, verification key, algorithm)
+_TOKEN_CACHE_MAXSIZE = 4096
+_token_cache = OrderedDict()
+_token_cache_lock = threading.Lock()
 
 def get_app_config():
     """Get the current app configuration"""
     return current_app.config
 
+# Auth settings read on every request, resolved once from the app config
+AuthSettings = namedtuple('AuthSettings', [
+    'algorithm', 'secret_key', 'secret_bytes', 'private_key', 'public_key',
+    'expiration_seconds', 'trust_gateway', 'gateway_secret'
+])
+
+# Header Kong's request-transformer sets to GATEWAY_AUTH_SECRET on jwt-protected routes
+GATEWAY_SECRET_HEADER = 'X-Gateway-Secret'
+
+_settings = None
+
+def load_auth_settings(config):
+    """Build AuthSettings from a Flask config mapping"""
+    trust_gateway = bool(config.get('TRUST_GATEWAY_AUTH'))
+    gateway_secret = config.get('GATEWAY_AUTH_SECRET')
+    if trust_gateway and not gateway_secret:
+        # Without it anyone reaching Flask directly could claim to be Kong
+        raise RuntimeError('TRUST_GATEWAY_AUTH requires GATEWAY_AUTH_SECRET')
+    return AuthSettings(
+        algorithm=config['JWT_ALGORITHM'],
+        secret_key=config['JWT_SECRET_KEY'],
+        secret_bytes=config['JWT_SECRET_KEY'].encode('utf-8'),
+        private_key=config.get('JWT_PRIVATE_KEY'),
+        public_key=config.get('JWT_PUBLIC_KEY'),
+        expiration_seconds=config['JWT_EXPIRATION_HOURS'] * 3600,
+        trust_gateway=trust_gateway,
+        gateway_secret=gateway_secret.encode('utf-8') if gateway_secret else None
+    )
+
+def init_auth(app):
+    """
+    Snapshot the app's JWT settings for the auth helpers.
+    
+    Call again after changing JWT_*, TRUST_GATEWAY_AUTH or GATEWAY_AUTH_SECRET in app.config;
+    until init_auth runs, settings are read from current_app.config per call.
+    """
+    global _settings
+    _settings = load_auth_settings(app.config)
+    return _settings
+
+def get_auth_settings():
+    """Return the settings snapshot taken by init_auth"""
+    if _settings is None:
+        return load_auth_settings(current_app.config)
+    return _settings
+
+# Compact HS256 codec - HMAC runs in OpenSSL via hmac/hashlib, JSON via orjson
+def _b64url_encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=')
+
+def _b64url_decode(data):
+    return base64.urlsafe_b64decode(data + b'=' * (-len(data) % 4))
+
+def _json_default(obj):
+    """Serialize datetime claims as NumericDate like PyJWT does"""
+    if isinstance(obj, datetime.datetime):
+        return calendar.timegm(obj.utctimetuple())
+    raise TypeError
+
+_HS256_HEADER = _b64url_encode(orjson.dumps({'alg': 'HS256', 'typ': 'JWT'}))
+
+# Decoder for the PyJWT paths - every token we issue carries exp, so require it
+_PYJWT = jwt.PyJWT(options={'require': ['exp']})
+
+# Claims the HS256 fast path leaves to PyJWT - our own tokens never carry them
+_PYJWT_ONLY_CLAIMS = frozenset({'nbf', 'aud'})
+
+def _encode_hs256(payload, key):
+    """Sign payload as a compact HS256 JWT"""
+    body = orjson.dumps(payload, default=_json_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+    signing_input = _HS256_HEADER + b'.' + _b64url_encode(body)
+    signature = hmac.new(key, signing_input, hashlib.sha256).digest()
+    return (signing_input + b'.' + _b64url_encode(signature)).decode('ascii')
+
+def _decode_hs256(token, key):
+    """Verify a compact HS256 JWT and return its payload, raising PyJWT's exception types"""
+    try:
+        signing_input, _, signature_segment = token.encode('ascii').rpartition(b'.')
+        header_segment, _, payload_segment = signing_input.partition(b'.')
+        header = orjson.loads(_b64url_decode(header_segment))
+        signature = _b64url_decode(signature_segment)
+    except ValueError:
+        raise jwt.DecodeError('Invalid token')
+    if not isinstance(header, dict) or header.get('alg') != 'HS256':
+        raise jwt.InvalidAlgorithmError('The specified alg value is not allowed')
+    
+    expected = hmac.new(key, signing_input, hashlib.sha256).digest()
+    if not hmac.compare_digest(signature, expected):
+        raise jwt.InvalidSignatureError('Signature verification failed')
+    
+    try:
+        payload = orjson.loads(_b64url_decode(payload_segment))
+    except ValueError:
+        raise jwt.DecodeError('Invalid payload')
+    if not isinstance(payload, dict):
+        raise jwt.DecodeError('Invalid payload')
+    
+    if 'exp' not in payload:
+        raise jwt.MissingRequiredClaimError('exp')
+    try:
+        exp = int(payload['exp'])
+    except (TypeError, ValueError):
+        raise jwt.DecodeError('Expiration Time claim (exp) must be an integer.')
+    now = time.time()
+    if exp <= now:
+        raise jwt.ExpiredSignatureError('Signature has expired')
+    if 'iat' in payload:
+        try:
+            iat = int(payload['iat'])
+        except (TypeError, ValueError):
+            raise jwt.InvalidIssuedAtError('Issued At claim (iat) must be an integer.')
+        if iat > now:
+            raise jwt.ImmatureSignatureError('The token is not yet valid (iat)')
+    return payload
+
+def is_asymmetric_algorithm(algorithm):
+    """True for public/private key algorithms (EdDSA, RS*, ES*, PS*)"""
+    return not algorithm.startswith('HS')
+
+def _encode_token(payload, settings):
+    algorithm = settings.algorithm
+    if algorithm == 'HS256':
+        return _encode_hs256(payload, settings.secret_bytes)
+    if is_asymmetric_algorithm(algorithm):
+        return jwt.encode(payload, settings.private_key, algorithm=algorithm)
+    return jwt.encode(payload, settings.secret_key, algorithm=algorithm)
+
+def _decode_token(token, settings):
+    algorithm = settings.algorithm
+    if algorithm == 'HS256':
+        payload = _decode_hs256(token, settings.secret_bytes)
+        if _PYJWT_ONLY_CLAIMS.isdisjoint(payload):
+            return payload
+        # Signature is valid but the token has claims only PyJWT validates
+        return _PYJWT.decode(token, settings.secret_key, algorithms=[algorithm])
+    if is_asymmetric_algorithm(algorithm):
+        return _PYJWT.decode(token, settings.public_key, algorithms=[algorithm])
+    return _PYJWT.decode(token, settings.secret_key, algorithms=[algorithm])
+
 # JWT Helper Functions
 def generate_jwt_token(user_data):
     """Generate JWT token for authenticated user"""
-    config = get_app_config()
+    settings = get_auth_settings()
+    now = int(time.time())
     payload = {
         'user_id': user_data.get('sub'),
         'email': user_data.get('email'),
         'name': user_data.get('name'),
         'picture': user_data.get('picture'),
-        'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=config['JWT_EXPIRATION_HOURS']),
-        'iat': datetime.datetime.utcnow()
+        # Kong's jwt plugin looks up the consumer credential (key = email) by iss
+        'iss': user_data.get('email'),
+        'exp': now + settings.expiration_seconds,
+        'iat': now
     }
-    return jwt.encode(payload, config['JWT_SECRET_KEY'], algorithm=config['JWT_ALGORITHM'])
+    return _encode_token(payload, settings)
+
+def _get_cached_payload(cache_key):
+    """Return a copy of the cached payload if present and not yet expired"""
+    with _token_cache_lock:
+        entry = _token_cache.get(cache_key)
+        if entry is None:
+            return None
+        payload, exp = entry
+        if exp is not None and exp <= time.time():
+            # Expired since it was cached - evict lazily
+            del _token_cache[cache_key]
+            return None
+        _token_cache.move_to_end(cache_key)
+    # Callers may modify the user dict, so each one gets its own copy
+    return dict(payload)
+
+def _cache_payload(cache_key, payload):
+    """Store a copy of a verified payload, evicting the least recently used entry when full"""
+    exp = payload.get('exp')
+    with _token_cache_lock:
+        _token_cache[cache_key] = (dict(payload), exp)
+        _token_cache.move_to_end(cache_key)
+        if len(_token_cache) > _TOKEN_CACHE_MAXSIZE:
+            _token_cache.popitem(last=False)
+
+def clear_token_cache():
+    """Drop all cached JWT verification results"""
+    with _token_cache_lock:
+        _token_cache.clear()
 
 def verify_jwt_token(token):
     """Verify and decode JWT token"""
-    config = get_app_config()
-    try:
-        payload = jwt.decode(token, config['JWT_SECRET_KEY'], algorithms=[config['JWT_ALGORITHM']])
+    settings = get_auth_settings()
+    cache_key = (token, settings.secret_key, settings.public_key, settings.algorithm)
+    payload = _get_cached_payload(cache_key)
+    if payload is not None:
         return payload
+    try:
+        payload = _decode_token(token, settings)
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
+    _cache_payload(cache_key, payload)
+    return payload
+
+def _cached_on_g(name, key, compute):
+    """
+    Memoize compute() on flask.g for the current request.
+    
+    The result is stored with its key, so an app context reused across requests
+    (e.g. in tests or CLI scripts) never returns another token's user.
+    """
+    cached = g.get(name)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    value = compute()
+    setattr(g, name, (key, value))
+    return value
 
 def get_user_from_cookie():
-    """Get user data from JWT stored in cookie"""
+    """Get user data from JWT stored in cookie (the verified token is kept on g.auth_token)"""
     token = request.cookies.get('auth_token')
     if token:
-        return verify_jwt_token(token)
+        user = _cached_on_g('_cookie_user', token, lambda: verify_jwt_token(token))
+        if user:
+            g.auth_token = token
+        return user
     return None
 
+def _get_gateway_user(token, settings):
+    """
+    Read the payload of a token Kong's jwt plugin has already verified.
+    
+    Kong sets X-Consumer-Username after a successful signature check, so the
+    signature is not re-verified here. The request must carry the shared
+    gateway secret (so it came through Kong, not straight to Flask), and the
+    jwt plugin's X-Credential-Identifier must be the token's iss (so Kong
+    authenticated this token, not e.g. a key-auth key of the same consumer).
+    The token must still belong to that consumer.
+    """
+    presented = request.headers.get(GATEWAY_SECRET_HEADER)
+    if not presented or not hmac.compare_digest(presented.encode('utf-8'), settings.gateway_secret):
+        return None
+    consumer = request.headers.get('X-Consumer-Username')
+    if not consumer or request.headers.get('X-Anonymous-Consumer') == 'true':
+        return None
+    try:
+        payload = jwt.decode(token, options={'verify_signature': False, 'verify_exp': True})
+    except jwt.InvalidTokenError:
+        return None
+    issuer = payload.get('iss')
+    if not issuer or issuer != request.headers.get('X-Credential-Identifier'):
+        return None
+    if payload.get('email') != consumer:
+        return None
+    return payload
+
 def get_user_from_header():
     """Get user data from JWT in Authorization header"""
-    auth_header = request.headers.get('Authorization')
-    if auth_header and auth_header.startswith('Bearer '):
-        token = auth_header.split(' ')[1]
-        return verify_jwt_token(token)
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header[:7] == 'Bearer ':
+        token = auth_header[7:]
+        # Gateway headers are part of the key since they decide how the token is trusted
+        headers = request.headers
+        key = (token, headers.get('X-Consumer-Username'), headers.get('X-Anonymous-Consumer'),
+               headers.get('X-Credential-Identifier'), headers.get(GATEWAY_SECRET_HEADER))
+        return _cached_on_g('_header_user', key, lambda: _verify_header_token(token))
     return None
 
+def _verify_header_token(token):
+    """Verify a Bearer token, trusting Kong's verification when TRUST_GATEWAY_AUTH is set"""
+    settings = get_auth_settings()
+    if settings.trust_gateway:
+        user = _get_gateway_user(token, settings)
+        if user:
+            return user
+    return verify_jwt_token(token)
+
 # Decorators
 def login_required_cookie(f):
     """Decorator for web routes that require authentication via cookie"""
@@ -3,50 +3,117 @@ Configuration settings for Flask OAuth2 application
 """
 
 import os
-from dotenv import load_dotenv
+import threading
+from dataclasses import dataclass
+from typing import Optional
 
-# Load environment variables
-load_dotenv()
+def load_env():
+    """
+    Load .env values into os.environ without overriding variables already set
+    
+    In production the compiled cache written by config.env_cache is used when
+    present, so workers skip finding and parsing .env (and never import dotenv).
+    Without python-dotenv installed only the real environment is used.
+    """
+    if os.getenv('FLASK_ENV') == 'production':
+        try:
+            from config._compiled_env import ENV
+        except ImportError:
+            pass
+        else:
+            for key, value in ENV.items():
+                os.environ.setdefault(key, value)
+            return
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return
+    load_dotenv()
+
+# Names built on first access, so importing this module reads no .env file
+_LAZY_NAMES = frozenset({'Config', 'DevelopmentConfig', 'ProductionConfig', 'TestingConfig', 'config'})
+_define_lock = threading.Lock()
+
+def _define_configs():
+    """Load the environment, then build the configuration classes from it"""
+    load_env()
+    
+    @dataclass(frozen=True, slots=True)
+    class Config:
+        """Base configuration class"""
+        SECRET_KEY: str = os.getenv('SECRET_KEY') or 'dev-secret-key-change-this'
+        JWT_SECRET_KEY: str = os.getenv('JWT_SECRET_KEY') or 'dev-jwt-secret-key-change-this'
+        JWT_ALGORITHM: str = os.getenv('JWT_ALGORITHM', 'HS256')
+        JWT_EXPIRATION_HOURS: int = 24
+        
+        # PEM keypair used when JWT_ALGORITHM is asymmetric (e.g. EdDSA, RS256)
+        JWT_PRIVATE_KEY: Optional[str] = os.getenv('JWT_PRIVATE_KEY')
+        JWT_PUBLIC_KEY: Optional[str] = os.getenv('JWT_PUBLIC_KEY')
+        
+        # Trust Kong's jwt plugin to have verified API tokens (X-Consumer-Username).
+        # Requires GATEWAY_AUTH_SECRET: only requests carrying it in X-Gateway-Secret
+        # (injected by Kong on jwt-protected routes) are trusted
+        TRUST_GATEWAY_AUTH: bool = os.getenv('TRUST_GATEWAY_AUTH', 'false').lower() == 'true'
+        GATEWAY_AUTH_SECRET: Optional[str] = os.getenv('GATEWAY_AUTH_SECRET')
+        
+        # Google OAuth2 configuration
+        GOOGLE_CLIENT_ID: Optional[str] = os.getenv('GOOGLE_CLIENT_ID')
+        GOOGLE_CLIENT_SECRET: Optional[str] = os.getenv('GOOGLE_CLIENT_SECRET')
+        GOOGLE_DISCOVERY_URL: str = "https://accounts.google.com/o/oauth2/auth"
+        GOOGLE_TOKEN_URL: str = "https://oauth2.googleapis.com/token"
+        GOOGLE_USERINFO_URL: str = "https://www.googleapis.com/oauth2/v2/userinfo"
+        # Fixed OAuth redirect URI; required unless DEBUG (debug setups derive it per request)
+        OAUTH_REDIRECT_URI: Optional[str] = os.getenv('OAUTH_REDIRECT_URI')
+
+        # Kong Gateway configuration
+        KONG_ADMIN_URL: str = os.getenv("KONG_ADMIN_URL", "http://localhost:8001")
+        KONG_GATEWAY_URL: str = os.getenv("KONG_GATEWAY_URL", "http://localhost:8000")
+        # Keep-alive connections to the Admin API; match the worker's thread count
+        KONG_ADMIN_POOL_MAXSIZE: int = int(os.getenv("KONG_ADMIN_POOL_MAXSIZE", "64"))
+        # Admin API requests in flight at once per process; extra calls wait their turn
+        KONG_ADMIN_CONCURRENCY: int = int(os.getenv("KONG_ADMIN_CONCURRENCY", "16"))
+
+    @dataclass(frozen=True, slots=True)
+    class DevelopmentConfig(Config):
+        """Development configuration"""
+        DEBUG: bool = True
+        ENV: str = 'development'
+
+    @dataclass(frozen=True, slots=True)
+    class ProductionConfig(Config):
+        """Production configuration"""
+        DEBUG: bool = False
+        ENV: str = 'production'
+
+    @dataclass(frozen=True, slots=True)
+    class TestingConfig(Config):
+        """Testing configuration"""
+        TESTING: bool = True
+        DEBUG: bool = True
+        ENV: str = 'testing'
 
-class Config:
-    """Base configuration class"""
-    SECRET_KEY = os.getenv('SECRET_KEY') or 'dev-secret-key-change-this'
-    JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY') or 'dev-jwt-secret-key-change-this'
-    JWT_ALGORITHM = 'HS256'
-    JWT_EXPIRATION_HOURS = 24
+    # Configuration dictionary - one immutable instance per environment
+    development = DevelopmentConfig()
+    config = {
+        'development': development,
+        'production': ProductionConfig(),
+        'testing': TestingConfig(),
+        'default': development
+    }
     
-    # Google OAuth2 configuration
-    GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
-    GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET')
-    GOOGLE_DISCOVERY_URL = "https://accounts.google.com/o/oauth2/auth"
-    GOOGLE_TOKEN_URL = "https://oauth2.googleapis.com/token"
-    GOOGLE_USERINFO_URL = "https://www.googleapis.com/oauth2/v2/userinfo"
-
-    # Kong Gateway configuration
-    KONG_ADMIN_URL = os.getenv("KONG_ADMIN_URL", "http://localhost:8001")
-    KONG_GATEWAY_URL = os.getenv("KONG_GATEWAY_URL", "http://localhost:8000")
-
-class DevelopmentConfig(Config):
-    """Development configuration"""
-    DEBUG = True
-    ENV = 'development'
-
-class ProductionConfig(Config):
-    """Production configuration"""
-    DEBUG = False
-    ENV = 'production'
-
-class TestingConfig(Config):
-    """Testing configuration"""
-    TESTING = True
-    DEBUG = True
-    ENV = 'testing'
-
-# Configuration dictionary
-config = {
-    'development': DevelopmentConfig,
-    'production': ProductionConfig,
-    'testing': TestingConfig,
-    'default': DevelopmentConfig
-}
+    return {
+        'Config': Config,
+        'DevelopmentConfig': DevelopmentConfig,
+        'ProductionConfig': ProductionConfig,
+        'TestingConfig': TestingConfig,
+        'config': config
+    }
 
+def __getattr__(name):
+    """Define the configuration classes on first access (PEP 562)"""
+    if name not in _LAZY_NAMES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _define_lock:
+        if name not in globals():
+            globals().update(_define_configs())
+    return globals()[name]
@@ -0,0 +1,36 @@
+"""
+Compiled .env cache for production
+
+Run once per deploy (./scripts/dev.sh config-cache) to turn the .env file into
+a plain Python module. Production workers then import it as bytecode instead
+of locating and parsing .env on every start.
+"""
+
+import os
+from dotenv import dotenv_values, find_dotenv
+
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '_compiled_env.py')
+
+
+def write_env_cache(env_path=None, cache_path=CACHE_PATH):
+    """
+    Write the values of a .env file to a Python module as an ENV dict
+    
+    Args:
+        env_path: .env file to read (default: the one load_dotenv would find)
+        cache_path: Module to write (default: config/_compiled_env.py)
+        
+    Returns:
+        dict: The cached values
+    """
+    values = dotenv_values(env_path or find_dotenv())
+    env = {key: value for key, value in values.items() if value is not None}
+    with open(cache_path, 'w') as f:
+        f.write('# Generated by config.env_cache - do not edit or commit\n')
+        f.write(f'ENV = {env!r}\n')
+    return env
+
+
+if __name__ == '__main__':
+    cached = write_env_cache()
+    print(f"Cached {len(cached)} .env values in {CACHE_PATH}")
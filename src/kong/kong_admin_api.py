@@ -3,14 +3,34 @@ Kong Admin API Client for server-to-server communication
 Manages Kong Gateway Consumers and API Keys via Admin API
 """
 
+import re
 import requests
 import logging
+import orjson
 import time
-from typing import Tuple, Dict, Any, Optional, List
+import threading
+import types
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from urllib.parse import quote
+from typing import Tuple, Dict, Any, Optional, List, Callable, Iterable, Iterator
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
 
+_logger = logging.getLogger(__name__)
+
+# Shared read-only empty mapping for internal lookups (never handed to callers)
+_EMPTY = types.MappingProxyType({})
+
+
+@lru_cache(maxsize=1024)
+def _quote(segment: str) -> str:
+    """URL-quote a path segment (consumer usernames are emails, so '@' and '+' are escaped)"""
+    return quote(segment, safe='')
+
+
 class KongAdminAPIError(Exception):
     """Base exception for Kong Admin API errors"""
     
@@ -18,7 +38,11 @@ class KongAdminAPIError(Exception):
         self.message = message
         self.status_code = status_code
         self.response_data = response_data or {}
-        super().__init__(f"Kong API Error {status_code}: {message}")
+        super().__init__(message, status_code)
+    
+    def __str__(self) -> str:
+        # Formatted only when the error is actually printed or logged
+        return f"Kong API Error {self.status_code}: {self.message}"
 
 
 class KongAdminAPI:
@@ -35,38 +59,132 @@ class KongAdminAPI:
             key_response, key_status = kong.create_consumer_key("johndoe")
     """
     
-    def __init__(self, base_url: str = "http://localhost:8001", timeout: int = 30):
+    # Retry strategy and headers are static, so every client shares them
+    # (urllib3 copies Retry objects when counting attempts, so sharing is safe)
+    _RETRY = Retry(
+        total=3,
+        status_forcelist=(429, 502, 503, 504),
+        allowed_methods=frozenset({"HEAD", "GET", "PUT", "DELETE", "OPTIONS", "TRACE", "POST"}),
+        backoff_factor=0.5,  # Wait ~0.5, 1, 2 seconds between retries...
+        backoff_jitter=0.5,  # ...plus up to 0.5s random jitter so clients don't retry in lockstep
+        respect_retry_after_header=True,  # Honor Kong's Retry-After on 429/503
+        raise_on_status=False
+    )
+    _DEFAULT_HEADERS = {
+        'Content-Type': 'application/json',
+        'User-Agent': 'KongAdminAPI-Client/1.0'
+    }
+    
+    # Connection pool sizing - shared by all threads using this client
+    POOL_CONNECTIONS = 32
+    POOL_MAXSIZE = 64
+    
+    # Stays within the connection pool, so workers never wait on a connection
+    DEFAULT_CONCURRENCY = 10
+    
+    # Requests in flight to Kong at once across all threads; bursts queue here
+    # instead of exhausting Kong's database connections
+    MAX_CONCURRENCY = 16
+    
+    # consumer_exists results are reused for a few seconds (bounded LRU)
+    EXISTS_CACHE_TTL = 5.0
+    EXISTS_CACHE_MAXSIZE = 1024
+    
+    # Endpoint templates - path segments are quoted with _quote
+    _EP_CONSUMER = "/consumers/%s"
+    _EP_KEY_AUTH = "/consumers/%s/key-auth"
+    _EP_KEY_AUTH_ID = "/consumers/%s/key-auth/%s"
+    _EP_JWT = "/consumers/%s/jwt"
+    
+    # Status codes raised as KongAdminAPIError
+    _ERR_STATUSES = frozenset({400, 404, 409})
+    
+    # Default error message prefixes by status code
+    _ERR_PREFIX = {400: "Bad request: ", 404: "Resource not found: ", 409: "Conflict: "}
+    
+    # More specific prefixes by status code, checked in order (first match wins)
+    _ERR_RULES = {
+        400: (
+            (re.compile('required', re.IGNORECASE), "Missing required field: "),
+            (re.compile('invalid', re.IGNORECASE), "Invalid data provided: "),
+        ),
+        409: (
+            (re.compile('UNIQUE violation'), "Duplicate resource: "),
+        ),
+    }
+    
+    def __init__(self, base_url: str = "http://localhost:8001", timeout: int = 30,
+                 pool_maxsize: Optional[int] = None, session: Optional[requests.Session] = None,
+                 max_concurrency: Optional[int] = None):
         """
         Initialize Kong Admin API client
         
         Args:
             base_url: Kong Admin API base URL (default: http://localhost:8001)
             timeout: Request timeout in seconds (default: 30)
+            pool_maxsize: Keep-alive connections kept open to Kong (default: POOL_MAXSIZE);
+                size it to the number of threads making Kong calls concurrently
+            session: Existing requests.Session to share (its adapters are used as-is)
+            max_concurrency: Requests sent to Kong at once by this client (default: MAX_CONCURRENCY);
+                further calls block until one finishes
         """
         self.base_url = base_url.rstrip('/')
         self.timeout = timeout
-        self.logger = logging.getLogger(__name__)
-        
-        # Configure session with retry strategy for 502/503 responses
-        self.session = requests.Session()
-        retry_strategy = Retry(
-            total=3,
-            status_forcelist=[502, 503, 504],
-            allowed_methods=["HEAD", "GET", "PUT", "DELETE", "OPTIONS", "TRACE", "POST"],
-            backoff_factor=1,  # Wait 1, 2, 4 seconds between retries
-            raise_on_status=False
-        )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        self.session.mount("http://", adapter)
-        self.session.mount("https://", adapter)
+        self.logger = _logger
+        
+        if session is not None:
+            # Shared session - reuse its keep-alive connections and adapters, and send
+            # our headers per request rather than changing the caller's session defaults
+            self.session = session
+            self._request_headers = self._DEFAULT_HEADERS
+        else:
+            # Configure session with retry strategy for 502/503 responses
+            self.session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=self.POOL_CONNECTIONS,
+                pool_maxsize=pool_maxsize or self.POOL_MAXSIZE,
+                max_retries=self._RETRY
+            )
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+            
+            # Set default headers
+            self.session.headers.update(self._DEFAULT_HEADERS)
+            self._request_headers = None
+        
+        self._request_slots = threading.BoundedSemaphore(max_concurrency or self.MAX_CONCURRENCY)
         
-        # Set default headers
-        self.session.headers.update({
-            'Content-Type': 'application/json',
-            'User-Agent': 'KongAdminAPI-Client/1.0'
-        })
+        # username_or_id -> (checked_at, exists)
+        self._exists_cache = OrderedDict()
+        self._exists_cache_lock = threading.Lock()
+        # Bumped by every consumer write, so lookups that overlapped one don't cache their answer
+        self._exists_generation = 0
+    
+    def _forget_consumer(self, *usernames_or_ids: Optional[str]):
+        """Drop cached consumer_exists results after a consumer is created, changed or deleted"""
+        with self._exists_cache_lock:
+            self._exists_generation += 1
+            for username_or_id in usernames_or_ids:
+                if username_or_id:
+                    self._exists_cache.pop(username_or_id, None)
     
-    def _make_request(self, method: str, endpoint: str, json_data: Dict = None) -> Tuple[Dict, int]:
+    def _write_consumer(self, method: str, endpoint: str, json_data: Optional[Dict],
+                        *usernames_or_ids: Optional[str]) -> Tuple[Dict, int]:
+        """
+        Send a consumer create/update/delete, then drop the consumer_exists results it affects
+        
+        Invalidated after the request (even a failed one may have reached Kong),
+        including the consumer's id from the response so UUID lookups don't go stale.
+        """
+        response = None
+        try:
+            response, status = self._make_request(method, endpoint, json_data)
+            return response, status
+        finally:
+            self._forget_consumer(*usernames_or_ids, (response or {}).get('id'))
+    
+    def _make_request(self, method: str, endpoint: str, json_data: Dict = None,
+                      params: Optional[Dict] = None) -> Tuple[Dict, int]:
         """
         Make HTTP request to Kong Admin API with logging and error handling
         
@@ -74,6 +192,7 @@ class KongAdminAPI:
             method: HTTP method (GET, POST, DELETE, etc.)
             endpoint: API endpoint (without base_url)
             json_data: Request payload for POST/PUT requests
+            params: Query string parameters (URL-encoded by requests)
             
         Returns:
             Tuple of (response_json, status_code)
@@ -84,48 +203,56 @@ class KongAdminAPI:
         url = f"{self.base_url}{endpoint}"
         
         # Log request details
-        self.logger.info(f"Kong API Request: {method} {url}")
-        if json_data:
+        self.logger.info("Kong API Request: %s %s", method, url)
+        if json_data and self.logger.isEnabledFor(logging.DEBUG):
             # Log payload but mask sensitive data
-            safe_payload = {k: v for k, v in json_data.items()}
-            if 'key' in safe_payload and safe_payload['key']:
-                safe_payload['key'] = f"{safe_payload['key'][:8]}***"
-            self.logger.debug(f"Request payload: {safe_payload}")
+            safe_payload = dict(json_data)
+            if safe_payload.get('key'):
+                safe_payload['key'] = safe_payload['key'][:8] + '***'
+            self.logger.debug("Request payload: %s", orjson.dumps(safe_payload).decode())
         
         try:
-            response = self.session.request(
-                method=method,
-                url=url,
-                json=json_data,
-                timeout=self.timeout
-            )
+            with self._request_slots:
+                response = self.session.request(
+                    method=method,
+                    url=url,
+                    params=params,
+                    headers=self._request_headers,
+                    data=orjson.dumps(json_data) if json_data is not None else None,
+                    timeout=self.timeout
+                )
             
             # Log response status
-            self.logger.info(f"Kong API Response: {response.status_code} for {method} {url}")
+            status_code = response.status_code
+            self.logger.info("Kong API Response: %s for %s %s", status_code, method, url)
+            
+            # 204 No Content (deletes) has no body to parse
+            if status_code == 204:
+                return {}, status_code
             
             # Parse JSON response
             try:
-                response_json = response.json()
-                self.logger.debug(f"Response body: {response_json}")
-            except ValueError:
+                response_json = orjson.loads(response.content)
+                self.logger.debug("Response body: %s", response_json)
+            except orjson.JSONDecodeError:
                 response_json = {"message": response.text or "Empty response"}
-                self.logger.debug(f"Non-JSON response: {response.text}")
+                self.logger.debug("Non-JSON response: %s", response.text)
             
             # Handle specific error status codes with meaningful messages
-            if response.status_code in [400, 404, 409]:
-                error_message = self._extract_error_message(response_json, response.status_code)
-                self.logger.error(f"Kong API error {response.status_code}: {error_message}")
+            if status_code >= 400 and status_code in self._ERR_STATUSES:
+                error_message = self._extract_error_message(response_json, status_code)
+                self.logger.error("Kong API error %s: %s", status_code, error_message)
                 raise KongAdminAPIError(
                     message=error_message,
-                    status_code=response.status_code,
+                    status_code=status_code,
                     response_data=response_json
                 )
             
-            return response_json, response.status_code
+            return response_json, status_code
             
         except requests.exceptions.RequestException as e:
             error_msg = f"Request failed: {str(e)}"
-            self.logger.error(f"Kong API request exception: {error_msg}")
+            self.logger.error("Kong API request exception: %s", error_msg)
             raise KongAdminAPIError(
                 message=error_msg,
                 status_code=0,
@@ -134,25 +261,18 @@ class KongAdminAPI:
     
     def _extract_error_message(self, response_json: Dict, status_code: int) -> str:
         """Extract meaningful error message from Kong API response"""
-        message = response_json.get('message', f'HTTP {status_code} error')
+        message = response_json.get('message')
+        if message is None:
+            message = f'HTTP {status_code} error'
         
         # Enhance error messages based on status code
-        if status_code == 400:
-            if 'required' in message.lower():
-                return f"Missing required field: {message}"
-            elif 'invalid' in message.lower():
-                return f"Invalid data provided: {message}"
-            else:
-                return f"Bad request: {message}"
-        elif status_code == 404:
-            return f"Resource not found: {message}"
-        elif status_code == 409:
-            if 'UNIQUE violation' in message:
-                return f"Duplicate resource: {message}"
-            else:
-                return f"Conflict: {message}"
-        
-        return message
+        prefix = self._ERR_PREFIX.get(status_code)
+        if prefix is None:
+            return message
+        for pattern, rule_prefix in self._ERR_RULES.get(status_code, ()):
+            if pattern.search(message):
+                return rule_prefix + message
+        return prefix + message
     
     def create_consumer(self, username: Optional[str] = None, custom_id: Optional[str] = None, 
                        tags: Optional[List[str]] = None) -> Tuple[Dict, int]:
@@ -184,8 +304,71 @@ class KongAdminAPI:
         if tags:
             payload['tags'] = tags
         
-        self.logger.info(f"Creating Kong consumer: username={username}, custom_id={custom_id}")
-        return self._make_request('POST', '/consumers', payload)
+        self.logger.info("Creating Kong consumer: username=%s, custom_id=%s", username, custom_id)
+        return self._write_consumer('POST', '/consumers', payload, username, custom_id)
+    
+    def upsert_consumer(self, username: str, custom_id: Optional[str] = None,
+                        tags: Optional[List[str]] = None) -> Tuple[Dict, int]:
+        """
+        Create a consumer, or update it if the username already exists
+        
+        Uses Kong's idempotent PUT /consumers/{username}. PUT replaces the
+        whole entity, so an existing consumer's custom_id and tags are reset
+        to the values given here - use ensure_consumer to keep them.
+        
+        Args:
+            username: Consumer username
+            custom_id: Custom ID for consumer (optional but must be unique)
+            tags: List of tags for the consumer (optional)
+            
+        Returns:
+            Tuple of (response_json, status_code)
+            - Success 200: {"id": "uuid", "username": "johndoe", ...}
+            
+        Raises:
+            KongAdminAPIError: 
+                - 400: Invalid data provided
+                - 409: custom_id already used by another consumer
+        """
+        payload = {}
+        if custom_id:
+            payload['custom_id'] = custom_id
+        if tags:
+            payload['tags'] = tags
+        
+        self.logger.info("Upserting Kong consumer: username=%s, custom_id=%s", username, custom_id)
+        return self._write_consumer('PUT', self._EP_CONSUMER % _quote(username), payload, username, custom_id)
+    
+    def ensure_consumer(self, username: str, custom_id: Optional[str] = None,
+                        tags: Optional[List[str]] = None) -> Tuple[Dict, int]:
+        """
+        Return a consumer, creating it with custom_id and tags if it doesn't exist yet
+        
+        POSTs first, so a new consumer costs a single round-trip; a 409 means
+        it already exists and it is fetched instead. Unlike upsert_consumer,
+        an existing consumer is returned unchanged, so tags or a custom_id
+        edited since it was created (e.g. a paid tier) are kept.
+        
+        Args:
+            username: Consumer username
+            custom_id: Custom ID used only when creating the consumer
+            tags: Tags used only when creating the consumer
+            
+        Returns:
+            Tuple of (response_json, status_code)
+            - Created 201 / Existing 200: {"id": "uuid", "username": "johndoe", ...}
+            
+        Raises:
+            KongAdminAPIError: 
+                - 400: Invalid data provided
+                - 404: custom_id already used by another consumer (the 409 wasn't the username)
+        """
+        try:
+            return self.create_consumer(username, custom_id=custom_id, tags=tags)
+        except KongAdminAPIError as e:
+            if e.status_code != 409:
+                raise
+        return self.get_consumer(username)
     
     def get_consumer(self, username_or_id: str) -> Tuple[Dict, int]:
         """
@@ -201,8 +384,8 @@ class KongAdminAPI:
         Raises:
             KongAdminAPIError: 404 if consumer not found
         """
-        self.logger.info(f"Getting Kong consumer: {username_or_id}")
-        return self._make_request('GET', f'/consumers/{username_or_id}')
+        self.logger.info("Getting Kong consumer: %s", username_or_id)
+        return self._make_request('GET', self._EP_CONSUMER % _quote(username_or_id))
     
     def create_consumer_key(self, username_or_id: str, key: Optional[str] = None) -> Tuple[Dict, int]:
         """
@@ -232,15 +415,16 @@ class KongAdminAPI:
         if key:
             payload['key'] = key
         
-        self.logger.info(f"Creating API key for consumer: {username_or_id}")
-        return self._make_request('POST', f'/consumers/{username_or_id}/key-auth', payload)
+        self.logger.info("Creating API key for consumer: %s", username_or_id)
+        return self._make_request('POST', self._EP_KEY_AUTH % _quote(username_or_id), payload)
     
-    def get_consumer_keys(self, username_or_id: str) -> Tuple[Dict, int]:
+    def get_consumer_keys(self, username_or_id: str, size: Optional[int] = None) -> Tuple[Dict, int]:
         """
         Get all API keys for a consumer
         
         Args:
             username_or_id: Consumer username or UUID
+            size: Page size (optional, e.g. 1 to just check whether any key exists)
             
         Returns:
             Tuple of (response_json, status_code)
@@ -258,8 +442,59 @@ class KongAdminAPI:
         Raises:
             KongAdminAPIError: 404 if consumer not found
         """
-        self.logger.info(f"Getting API keys for consumer: {username_or_id}")
-        return self._make_request('GET', f'/consumers/{username_or_id}/key-auth')
+        params = {'size': size} if size else None
+        
+        self.logger.info("Getting API keys for consumer: %s", username_or_id)
+        return self._make_request('GET', self._EP_KEY_AUTH % _quote(username_or_id), params=params)
+    
+    def create_consumer_jwt(self, username_or_id: str, key: str, algorithm: str = "EdDSA",
+                            rsa_public_key: Optional[str] = None) -> Tuple[Dict, int]:
+        """
+        Create a JWT credential for a consumer
+        
+        Note: The jwt plugin must be enabled for Kong to verify tokens at the edge
+        
+        Args:
+            username_or_id: Consumer username or UUID
+            key: Value Kong matches against the token's key claim (key_claim_name, iss by default)
+            algorithm: Signing algorithm (EdDSA, RS256, ES256, ...)
+            rsa_public_key: PEM public key for asymmetric algorithms
+            
+        Returns:
+            Tuple of (response_json, status_code)
+            - Success 201: {"id": "uuid", "key": "...", "algorithm": "EdDSA", ...}
+            
+        Raises:
+            KongAdminAPIError: 
+                - 400: Invalid algorithm or public key
+                - 404: Consumer not found
+        """
+        payload = {'key': key, 'algorithm': algorithm}
+        if rsa_public_key:
+            payload['rsa_public_key'] = rsa_public_key
+        
+        self.logger.info("Creating JWT credential for consumer: %s", username_or_id)
+        return self._make_request('POST', self._EP_JWT % _quote(username_or_id), payload)
+    
+    def get_consumer_jwts(self, username_or_id: str, size: Optional[int] = None) -> Tuple[Dict, int]:
+        """
+        Get all JWT credentials for a consumer
+        
+        Args:
+            username_or_id: Consumer username or UUID
+            size: Page size (optional, e.g. 1 to just check whether any credential exists)
+            
+        Returns:
+            Tuple of (response_json, status_code)
+            - Success 200: {"data": [{"id": "uuid", "key": "...", "algorithm": "EdDSA", ...}], "next": null}
+            
+        Raises:
+            KongAdminAPIError: 404 if consumer not found
+        """
+        params = {'size': size} if size else None
+        
+        self.logger.info("Getting JWT credentials for consumer: %s", username_or_id)
+        return self._make_request('GET', self._EP_JWT % _quote(username_or_id), params=params)
     
     def delete_consumer(self, username_or_id: str) -> Tuple[Dict, int]:
         """
@@ -275,8 +510,8 @@ class KongAdminAPI:
         Raises:
             KongAdminAPIError: 404 if consumer not found
         """
-        self.logger.info(f"Deleting Kong consumer: {username_or_id}")
-        return self._make_request('DELETE', f'/consumers/{username_or_id}')
+        self.logger.info("Deleting Kong consumer: %s", username_or_id)
+        return self._write_consumer('DELETE', self._EP_CONSUMER % _quote(username_or_id), None, username_or_id)
     
     def delete_consumer_key(self, username_or_id: str, key_id: str) -> Tuple[Dict, int]:
         """
@@ -293,8 +528,8 @@ class KongAdminAPI:
         Raises:
             KongAdminAPIError: 404 if consumer or key not found
         """
-        self.logger.info(f"Deleting API key {key_id} for consumer: {username_or_id}")
-        return self._make_request('DELETE', f'/consumers/{username_or_id}/key-auth/{key_id}')
+        self.logger.info("Deleting API key %s for consumer: %s", key_id, username_or_id)
+        return self._make_request('DELETE', self._EP_KEY_AUTH_ID % (_quote(username_or_id), _quote(key_id)))
     
     def health_check(self) -> Tuple[Dict, int]:
         """
@@ -323,31 +558,182 @@ class KongAdminAPI:
         if offset:
             params['offset'] = offset
         
-        endpoint = '/consumers'
-        if params:
-            query_string = '&'.join([f"{k}={v}" for k, v in params.items()])
-            endpoint = f"{endpoint}?{query_string}"
+        self.logger.info("Listing consumers with size=%s", size)
+        return self._make_request('GET', '/consumers', params=params)
+    
+    def map_concurrent(self, func: Callable, items: Iterable, max_workers: Optional[int] = None) -> List:
+        """
+        Call func on each item concurrently, sharing this client's connection pool
+        
+        Kong calls are I/O bound, so N independent requests take roughly one
+        round-trip instead of N. Exceptions are returned in place of results,
+        like asyncio.gather(..., return_exceptions=True).
+        
+        Args:
+            func: Callable taking one item, usually a bound method of this client
+            items: Arguments to call func with
+            max_workers: Maximum concurrent requests (default: DEFAULT_CONCURRENCY)
+            
+        Returns:
+            List of results (or exceptions) in the same order as items
+            
+        Example:
+            results = kong.map_concurrent(kong.delete_consumer, ["alice", "bob"])
+        """
+        items = list(items)
+        if not items:
+            return []
+        
+        def call(item):
+            try:
+                return func(item)
+            except Exception as e:
+                return e
+        
+        workers = min(max_workers or self.DEFAULT_CONCURRENCY, len(items))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='kong-admin') as executor:
+            return list(executor.map(call, items))
+    
+    def _iter_pages(self, endpoint: str, size: int = 100, filters: Optional[Dict] = None) -> Iterator[Dict]:
+        """
+        Yield the items of a paginated Kong list endpoint, one page at a time
+        
+        Only a single page is held in memory; the next page is requested
+        once the current one has been consumed.
+        
+        Raises:
+            KongAdminAPIError: For error responses, including unexpected non-200 statuses
+        """
+        filters = filters or {}
+        params = {'size': size, **filters}
+        while True:
+            response_json, status = self._make_request('GET', endpoint, params=params)
+            if status != 200:
+                raise KongAdminAPIError(
+                    message=self._extract_error_message(response_json, status),
+                    status_code=status,
+                    response_data=response_json
+                )
+            yield from response_json.get('data', ())
+            
+            offset = response_json.get('offset')
+            if not offset:
+                return
+            params = {'size': size, 'offset': offset, **filters}
+    
+    def iter_consumers(self, size: int = 100, tags: Optional[List[str]] = None) -> Iterator[Dict]:
+        """
+        Iterate over all consumers, following Kong's pagination offsets
+        
+        Args:
+            size: Page size (default: 100)
+            tags: Only consumers carrying all of these tags (filtered by Kong)
+            
+        Yields:
+            Consumer dicts: {"id": "uuid", "username": "johndoe", ...}
+        """
+        self.logger.info("Iterating consumers with page size=%s, tags=%s", size, tags)
+        return self._iter_pages('/consumers', size, {'tags': ','.join(tags)} if tags else None)
+    
+    def iter_consumer_keys(self, username_or_id: str, size: int = 100) -> Iterator[Dict]:
+        """
+        Iterate over all API keys of a consumer, following Kong's pagination offsets
         
-        self.logger.info(f"Listing consumers with size={size}")
-        return self._make_request('GET', endpoint)
+        Args:
+            username_or_id: Consumer username or UUID
+            size: Page size (default: 100)
+            
+        Yields:
+            Key dicts: {"key": "...", "id": "abcd...", "created_at": 1723456700000, ...}
+            
+        Raises:
+            KongAdminAPIError: 404 if consumer not found
+        """
+        self.logger.info("Iterating API keys for consumer: %s", username_or_id)
+        return self._iter_pages(self._EP_KEY_AUTH % _quote(username_or_id), size)
     
     def consumer_exists(self, username_or_id: str) -> bool:
         """
         Check if a consumer exists
         
+        Results are cached for EXISTS_CACHE_TTL seconds; creating, upserting
+        or deleting a consumer through this client invalidates its entry.
+        
         Args:
             username_or_id: Consumer username or UUID
             
         Returns:
             bool: True if consumer exists, False otherwise
         """
+        now = time.monotonic()
+        with self._exists_cache_lock:
+            entry = self._exists_cache.get(username_or_id)
+            if entry is not None and now - entry[0] < self.EXISTS_CACHE_TTL:
+                self._exists_cache.move_to_end(username_or_id)
+                return entry[1]
+            generation = self._exists_generation
+        
         try:
             _, status = self.get_consumer(username_or_id)
-            return status == 200
+            exists = status == 200
         except KongAdminAPIError as e:
             if e.status_code == 404:
-                return False
-            raise  # Re-raise other errors
+                exists = False
+            else:
+                raise  # Re-raise other errors
+        
+        with self._exists_cache_lock:
+            if generation != self._exists_generation:
+                return exists  # A write overlapped the lookup, so the answer may already be stale
+            self._exists_cache[username_or_id] = (now, exists)
+            self._exists_cache.move_to_end(username_or_id)
+            if len(self._exists_cache) > self.EXISTS_CACHE_MAXSIZE:
+                self._exists_cache.popitem(last=False)
+        return exists
+
+
+# Shared clients, one per Admin API URL, so every caller reuses the same connection pool
+_kong_clients: Dict[str, KongAdminAPI] = {}
+_kong_clients_lock = threading.Lock()
+
+
+def get_kong_api(base_url: str = "http://localhost:8001", **client_options) -> KongAdminAPI:
+    """
+    Get the process-wide KongAdminAPI client for a Kong Admin API URL
+    
+    Options only apply when the client for base_url is created. Later calls
+    that pass a different value get the existing client and a logged warning;
+    options left out (or None) never conflict.
+    
+    Args:
+        base_url: Kong Admin API base URL (default: http://localhost:8001)
+        **client_options: KongAdminAPI options used to create the client -
+            timeout: Request timeout in seconds
+            pool_maxsize: Keep-alive connections kept open to Kong
+            session: Existing requests.Session to share
+            max_concurrency: Requests sent to Kong at once
+        
+    Returns:
+        KongAdminAPI: Shared client, created on first use
+    """
+    base_url = base_url.rstrip('/')
+    client_options = {name: value for name, value in client_options.items() if value is not None}
+    kong_api = _kong_clients.get(base_url)
+    if kong_api is None:
+        with _kong_clients_lock:
+            kong_api = _kong_clients.get(base_url)
+            if kong_api is None:
+                kong_api = _kong_clients[base_url] = KongAdminAPI(base_url, **client_options)
+                kong_api._client_options = client_options
+                return kong_api
+    
+    created_with = getattr(kong_api, '_client_options', {})
+    conflicts = sorted(name for name, value in client_options.items()
+                       if name not in created_with or created_with[name] != value)
+    if conflicts:
+        _logger.warning("Kong client for %s already exists; ignoring different %s",
+                        base_url, ', '.join(conflicts))
+    return kong_api
 
 
 # Example usage for integration with your Flask app
@@ -358,8 +744,22 @@ class KongServiceManager:
     """
     
     def __init__(self, kong_base_url: str = "http://localhost:8001"):
-        self.kong_api = KongAdminAPI(kong_base_url)
-        self.logger = logging.getLogger(__name__)
+        self.kong_api = get_kong_api(kong_base_url)
+        self.logger = _logger
+        self._revoke_listeners = []
+    
+    def add_revoke_listener(self, callback: Callable[[str], None]):
+        """
+        Call callback(username) after this manager revokes a user's key or deletes their consumer
+        
+        Covers every revoke path (revoke_user_api_key, revoke_keys_bulk,
+        cleanup_user_access, cleanup_many), so caches of issued keys stay in step.
+        """
+        self._revoke_listeners.append(callback)
+    
+    def _notify_revoked(self, username: str):
+        for callback in self._revoke_listeners:
+            callback(username)
     
     def provision_user_api_access(self, user_id: str, username: str, email: str) -> Dict[str, Any]:
         """
@@ -383,14 +783,14 @@ class KongServiceManager:
             
             if status == 201:
                 consumer_id = consumer_response['id']
-                self.logger.info(f"Created Kong consumer {consumer_id} for user {user_id}")
+                self.logger.info("Created Kong consumer %s for user %s", consumer_id, user_id)
                 
                 # Create API key for the consumer
                 key_response, key_status = self.kong_api.create_consumer_key(username)
                 
                 if key_status == 201:
                     api_key = key_response['key']
-                    self.logger.info(f"Created API key for user {user_id}")
+                    self.logger.info("Created API key for user %s", user_id)
                     
                     return {
                         'success': True,
@@ -400,21 +800,21 @@ class KongServiceManager:
                         'message': 'API access provisioned successfully'
                     }
                 else:
-                    self.logger.error(f"Failed to create API key for user {user_id}")
+                    self.logger.error("Failed to create API key for user %s", user_id)
                     return {
                         'success': False,
                         'error': 'Failed to create API key',
                         'consumer_id': consumer_id
                     }
             else:
-                self.logger.error(f"Failed to create Kong consumer for user {user_id}")
+                self.logger.error("Failed to create Kong consumer for user %s", user_id)
                 return {
                     'success': False,
                     'error': 'Failed to create Kong consumer'
                 }
                 
         except KongAdminAPIError as e:
-            self.logger.error(f"Kong API error for user {user_id}: {e}")
+            self.logger.error("Kong API error for user %s: %s", user_id, e)
             
             # Handle duplicate consumer gracefully
             if e.status_code == 409:
@@ -430,12 +830,31 @@ class KongServiceManager:
                 'status_code': e.status_code
             }
         except Exception as e:
-            self.logger.error(f"Unexpected error provisioning API access for user {user_id}: {e}")
+            self.logger.error("Unexpected error provisioning API access for user %s: %s", user_id, e)
             return {
                 'success': False,
                 'error': f'Unexpected error: {str(e)}'
             }
     
+    def provision_many(self, users: Iterable[Tuple[str, str, str]],
+                       max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Provision API access for many users concurrently (e.g. bulk imports)
+        
+        Each user's consumer and key are still created in order, but users are
+        provisioned in parallel, so N users take about 2 round-trips instead of 2*N.
+        
+        Args:
+            users: (user_id, username, email) tuples
+            max_workers: Maximum concurrent users (default: KongAdminAPI.DEFAULT_CONCURRENCY)
+            
+        Returns:
+            List of provision_user_api_access results in the same order as users
+        """
+        return self.kong_api.map_concurrent(
+            lambda user: self.provision_user_api_access(*user), users, max_workers=max_workers
+        )
+    
     def get_user_api_keys(self, username: str) -> Dict[str, Any]:
         """
         Get all API keys for a user
@@ -447,25 +866,21 @@ class KongServiceManager:
             Dict with success status and keys list
         """
         try:
-            keys_response, status = self.kong_api.get_consumer_keys(username)
-            
-            if status == 200:
-                keys = keys_response.get('data', [])
-                return {
-                    'success': True,
-                    'keys': [
-                        {
-                            'id': key['id'],
-                            'key': key['key'],
-                            'created_at': key.get('created_at'),
-                            'consumer_id': key.get('consumer', {}).get('id')
-                        }
-                        for key in keys
-                    ],
-                    'count': len(keys)
+            # Project each key as its page streams in, across all pages
+            keys = [
+                {
+                    'id': key['id'],
+                    'key': key['key'],
+                    'created_at': key.get('created_at'),
+                    'consumer_id': (key.get('consumer') or _EMPTY).get('id')
                 }
-            
-            return {'success': False, 'error': 'Failed to retrieve API keys'}
+                for key in self.kong_api.iter_consumer_keys(username)
+            ]
+            return {
+                'success': True,
+                'keys': keys,
+                'count': len(keys)
+            }
             
         except KongAdminAPIError as e:
             return {
@@ -486,10 +901,14 @@ class KongServiceManager:
             Dict with success status
         """
         try:
-            response, status = self.kong_api.delete_consumer_key(username, key_id)
+            try:
+                response, status = self.kong_api.delete_consumer_key(username, key_id)
+            finally:
+                # Even a failed delete may have reached Kong, so cached keys are dropped either way
+                self._notify_revoked(username)
             
             if status == 204:
-                self.logger.info(f"Revoked API key {key_id} for user {username}")
+                self.logger.info("Revoked API key %s for user %s", key_id, username)
                 return {
                     'success': True,
                     'message': 'API key revoked successfully'
@@ -504,6 +923,29 @@ class KongServiceManager:
                 'status_code': e.status_code
             }
     
+    def revoke_keys_bulk(self, username: str, key_ids: Iterable[str],
+                         max_workers: int = 4) -> Dict[str, Dict[str, Any]]:
+        """
+        Revoke several API keys for a user concurrently
+        
+        Args:
+            username: User's username
+            key_ids: IDs of the keys to revoke
+            max_workers: Maximum concurrent deletes (default: 4, to stay gentle on Kong)
+            
+        Returns:
+            Dict mapping each key ID to its revoke_user_api_key result
+        """
+        key_ids = list(key_ids)
+        results = self.kong_api.map_concurrent(
+            lambda key_id: self.revoke_user_api_key(username, key_id), key_ids, max_workers=max_workers
+        )
+        return {
+            key_id: result if not isinstance(result, Exception)
+            else {'success': False, 'error': f'Unexpected error: {str(result)}'}
+            for key_id, result in zip(key_ids, results)
+        }
+    
     def cleanup_user_access(self, username: str) -> Dict[str, Any]:
         """
         Remove all API access for a user (delete consumer and all keys)
@@ -515,10 +957,13 @@ class KongServiceManager:
             Dict with success status
         """
         try:
-            response, status = self.kong_api.delete_consumer(username)
+            try:
+                response, status = self.kong_api.delete_consumer(username)
+            finally:
+                self._notify_revoked(username)
             
             if status == 204:
-                self.logger.info(f"Deleted Kong consumer for user {username}")
+                self.logger.info("Deleted Kong consumer for user %s", username)
                 return {
                     'success': True,
                     'message': 'All API access removed successfully'
@@ -532,3 +977,22 @@ class KongServiceManager:
                 'error': f'Kong API error: {e.message}',
                 'status_code': e.status_code
             }
+    
+    def cleanup_many(self, usernames: Iterable[str], max_workers: int = 16) -> Dict[str, Dict[str, Any]]:
+        """
+        Remove API access for many users concurrently (e.g. bulk tenant deletion)
+        
+        Args:
+            usernames: Usernames to clean up
+            max_workers: Maximum concurrent deletes (default: 16, within the connection pool)
+            
+        Returns:
+            Dict mapping each username to its cleanup_user_access result
+        """
+        usernames = list(usernames)
+        results = self.kong_api.map_concurrent(self.cleanup_user_access, usernames, max_workers=max_workers)
+        return {
+            username: result if not isinstance(result, Exception)
+            else {'success': False, 'error': f'Unexpected error: {str(result)}'}
+            for username, result in zip(usernames, results)
+        }
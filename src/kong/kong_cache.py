@@ -0,0 +1,91 @@
+"""
+In-process cache for Kong consumer lookups
+Lets repeat logins skip the Admin API and keeps logins working while Kong is unreachable
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class ConsumerCache:
+    """
+    Bounded LRU cache of Kong consumer lookups with stale fallback
+
+    Successful results stay fresh for the fetch duration + 2s, clamped to
+    [MIN_TTL, MAX_TTL]. Expired entries are kept, so if Kong fails (fetch
+    returns None) the last known value is served instead. Failures with no
+    previous value are negatively cached for NEGATIVE_TTL seconds.
+
+    Example usage:
+        cache = ConsumerCache()
+        consumer_id = cache.get_or_set(email, lambda: provision(email))
+    """
+
+    MIN_TTL = 10.0
+    MAX_TTL = 30.0
+    NEGATIVE_TTL = 2.0
+
+    def __init__(self, maxsize: int = 4096):
+        """
+        Initialize the cache
+
+        Args:
+            maxsize: Maximum number of keys kept, least recently used evicted first
+        """
+        self.maxsize = maxsize
+        # key -> (value, fresh_until)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_set(self, key: Hashable, fetch: Callable[[], Optional[Any]]) -> Optional[Any]:
+        """
+        Return the cached value for key, calling fetch when it is missing or stale
+
+        Args:
+            key: Cache key (e.g. the user's email)
+            fetch: Callable returning the value, or None on failure
+
+        Returns:
+            The fresh value, the last known value if fetch failed, or None
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now < entry[1]:
+                self._entries.move_to_end(key)
+                return entry[0]
+
+        value = fetch()
+        finished = time.monotonic()
+
+        if value is None:
+            # Serve the stale value (if any) and retry Kong after NEGATIVE_TTL
+            value = entry[0] if entry is not None else None
+            ttl = self.NEGATIVE_TTL
+        else:
+            ttl = min(max(finished - now + 2.0, self.MIN_TTL), self.MAX_TTL)
+
+        with self._lock:
+            self._entries[key] = (value, finished + ttl)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Return the last known value for key, fresh or stale, without fetching"""
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def invalidate(self, key: Hashable):
+        """Drop a key, e.g. after its consumer was deleted"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop all cached values"""
+        with self._lock:
+            self._entries.clear()
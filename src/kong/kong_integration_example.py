@@ -5,19 +5,63 @@ This shows how to integrate Kong API management into your existing authenticatio
 without exposing Kong endpoints to end users.
 """
 
-from kong_admin_api import KongServiceManager, KongAdminAPIError
+from kong.kong_admin_api import KongServiceManager, KongAdminAPIError
+from kong.kong_utils import email_to_kong_username
+from collections import OrderedDict
+from typing import Optional
 import logging
+import threading
+import time
 
 
+_logger = logging.getLogger(__name__)
+
 class UserAPIService:
     """
     Service layer for managing user API access in your SBOM SaaS application
     This integrates with your existing authentication system
     """
     
+    # Successful setups are remembered so repeat logins skip Kong (bounded LRU).
+    # Revokes through kong_service drop entries at once; the TTL matches
+    # ConsumerCache.MAX_TTL so keys removed directly in Kong expire quickly too
+    PROVISIONED_TTL = 30.0
+    PROVISIONED_MAXSIZE = 50000
+    
     def __init__(self, kong_base_url: str = "http://localhost:8001"):
         self.kong_service = KongServiceManager(kong_base_url)
-        self.logger = logging.getLogger(__name__)
+        self.logger = _logger
+        
+        # username -> (stored_at, setup result)
+        self._provisioned = OrderedDict()
+        self._provisioned_lock = threading.Lock()
+        self.kong_service.add_revoke_listener(self._forget_provisioned)
+    
+    def _get_provisioned(self, username: str) -> Optional[dict]:
+        """Return a copy of the remembered setup result for username, if still fresh"""
+        now = time.monotonic()
+        with self._provisioned_lock:
+            entry = self._provisioned.get(username)
+            if entry is None:
+                return None
+            if now - entry[0] >= self.PROVISIONED_TTL:
+                del self._provisioned[username]
+                return None
+            self._provisioned.move_to_end(username)
+            return dict(entry[1])
+    
+    def _remember_provisioned(self, username: str, result: dict):
+        """Remember a successful setup result, evicting the least recently used entry when full"""
+        with self._provisioned_lock:
+            self._provisioned[username] = (time.monotonic(), dict(result))
+            self._provisioned.move_to_end(username)
+            if len(self._provisioned) > self.PROVISIONED_MAXSIZE:
+                self._provisioned.popitem(last=False)
+    
+    def _forget_provisioned(self, username: str):
+        """Drop the remembered setup after the user's keys change"""
+        with self._provisioned_lock:
+            self._provisioned.pop(username, None)
     
     def setup_user_api_access(self, user_data: dict) -> dict:
         """
@@ -35,9 +79,13 @@ class UserAPIService:
         name = user_data.get('name', '')
         
         # Create username from email (remove @ and special chars)
-        username = email.split('@')[0].replace('.', '_').replace('+', '_')
+        username = email_to_kong_username(email)
         
-        self.logger.info(f"Setting up API access for user {user_id} ({email})")
+        provisioned = self._get_provisioned(username)
+        if provisioned is not None:
+            return provisioned
+        
+        self.logger.info("Setting up API access for user %s (%s)", user_id, email)
         
         try:
             result = self.kong_service.provision_user_api_access(
@@ -47,35 +95,39 @@ class UserAPIService:
             )
             
             if result['success']:
-                self.logger.info(f"API access provisioned for user {user_id}")
-                return {
+                self.logger.info("API access provisioned for user %s", user_id)
+                provisioned = {
                     'success': True,
                     'api_key': result['api_key'],
                     'consumer_id': result['consumer_id'],
                     'username': username
                 }
+                self._remember_provisioned(username, provisioned)
+                return provisioned
             else:
                 # Handle duplicate gracefully
                 if result.get('duplicate'):
-                    self.logger.info(f"User {user_id} already has API access")
+                    self.logger.info("User %s already has API access", user_id)
                     # Try to get existing keys
                     keys_result = self.kong_service.get_user_api_keys(username)
                     if keys_result['success'] and keys_result['keys']:
-                        return {
+                        provisioned = {
                             'success': True,
                             'api_key': keys_result['keys'][0]['key'],
                             'username': username,
                             'existing': True
                         }
+                        self._remember_provisioned(username, provisioned)
+                        return provisioned
                 
-                self.logger.error(f"Failed to provision API access for user {user_id}: {result['error']}")
+                self.logger.error("Failed to provision API access for user %s: %s", user_id, result['error'])
                 return {
                     'success': False,
                     'error': result['error']
                 }
                 
         except Exception as e:
-            self.logger.error(f"Unexpected error setting up API access for user {user_id}: {e}")
+            self.logger.error("Unexpected error setting up API access for user %s: %s", user_id, e)
             return {
                 'success': False,
                 'error': 'Internal error setting up API access'
@@ -91,7 +143,7 @@ class UserAPIService:
         Returns:
             Dict with API keys and usage information
         """
-        username = email.split('@')[0].replace('.', '_').replace('+', '_')
+        username = email_to_kong_username(email)
         
         try:
             result = self.kong_service.get_user_api_keys(username)
@@ -110,7 +162,7 @@ class UserAPIService:
                 }
                 
         except Exception as e:
-            self.logger.error(f"Error getting API info for {email}: {e}")
+            self.logger.error("Error getting API info for %s: %s", email, e)
             return {
                 'success': False,
                 'error': 'Failed to retrieve API information'
@@ -126,18 +178,22 @@ class UserAPIService:
         Returns:
             Dict with new API key or error details
         """
-        username = email.split('@')[0].replace('.', '_').replace('+', '_')
+        username = email_to_kong_username(email)
         
         try:
             # Get existing keys
             keys_result = self.kong_service.get_user_api_keys(username)
             
             if keys_result['success']:
-                # Revoke existing keys
-                for key in keys_result['keys']:
-                    revoke_result = self.kong_service.revoke_user_api_key(username, key['id'])
+                # Revoke existing keys concurrently
+                revoke_results = self.kong_service.revoke_keys_bulk(
+                    username, [key['id'] for key in keys_result['keys']]
+                )
+                for key_id, revoke_result in revoke_results.items():
                     if revoke_result['success']:
-                        self.logger.info(f"Revoked API key {key['id']} for {email}")
+                        self.logger.info("Revoked API key %s for %s", key_id, email)
+                # revoke_keys_bulk's listener only runs when there were keys to revoke
+                self._forget_provisioned(username)
                 
                 # Create new key
                 user_data = {'user_id': username, 'email': email}
@@ -149,7 +205,7 @@ class UserAPIService:
             }
             
         except Exception as e:
-            self.logger.error(f"Error regenerating API key for {email}: {e}")
+            self.logger.error("Error regenerating API key for %s: %s", email, e)
             return {
                 'success': False,
                 'error': 'Failed to regenerate API key'
@@ -165,18 +221,19 @@ class UserAPIService:
         Returns:
             Dict with success status
         """
-        username = email.split('@')[0].replace('.', '_').replace('+', '_')
+        username = email_to_kong_username(email)
         
         try:
+            self._forget_provisioned(username)
             result = self.kong_service.cleanup_user_access(username)
             
             if result['success']:
-                self.logger.info(f"Revoked all API access for {email}")
+                self.logger.info("Revoked all API access for %s", email)
             
             return result
             
         except Exception as e:
-            self.logger.error(f"Error revoking API access for {email}: {e}")
+            self.logger.error("Error revoking API access for %s: %s", email, e)
             return {
                 'success': False,
                 'error': 'Failed to revoke API access'
@@ -3,22 +3,74 @@ Utility functions for Kong integration with your Flask SBOM SaaS app
 These functions help manage user API access in your application
 """
 
-from kong_admin_api import KongAdminAPI, KongAdminAPIError
+from kong.kong_admin_api import KongAdminAPIError, get_kong_api as get_shared_kong_api
 from flask import current_app
+from functools import lru_cache, wraps
+from concurrent.futures import ThreadPoolExecutor
 import logging
 
 
+# Characters Kong usernames can't keep from an email's local part, all mapped to '_'
+_USERNAME_TABLE = str.maketrans({'.': '_', '+': '_'})
+
+# Runs independent Kong reads alongside the request thread
+_lookup_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='kong-utils')
+
+
 def get_kong_api():
-    """Get configured Kong API instance"""
-    kong_url = current_app.config.get('KONG_ADMIN_URL', 'http://localhost:8001')
-    return KongAdminAPI(kong_url)
+    """Get the app's Kong API instance, shared across requests"""
+    kong_api = current_app.extensions.get('kong_api')
+    if kong_api is None:
+        kong_url = current_app.config.get('KONG_ADMIN_URL', 'http://localhost:8001')
+        kong_api = current_app.extensions.setdefault('kong_api', get_shared_kong_api(kong_url))
+    return kong_api
 
 
+def kong_call(action, default=None, not_found=None):
+    """
+    Decorator giving a Kong helper the shared error handling
+    
+    The wrapped function only implements the happy path; Kong and unexpected
+    errors are logged and turned into {'success': False, 'error': ...} results.
+    
+    Args:
+        action: What the helper does, used in log messages (e.g. 'getting keys')
+        default: Extra fields added to every error result (e.g. {'keys': []})
+        not_found: Error message returned without logging when Kong answers 404
+    """
+    extra = default or {}
+    
+    def error_result(error):
+        # Copy list defaults so callers never share (and mutate) one instance
+        result = {k: list(v) if isinstance(v, list) else v for k, v in extra.items()}
+        result['success'] = False
+        result['error'] = error
+        return result
+    
+    def decorator(f):
+        @wraps(f)
+        def wrapper(user_email, *args, **kwargs):
+            try:
+                return f(user_email, *args, **kwargs)
+            except KongAdminAPIError as e:
+                if not_found and e.status_code == 404:
+                    return error_result(not_found)
+                current_app.logger.error("Kong API error %s for %s: %s", action, user_email, e.message)
+                return error_result(f'Kong API error: {e.message}')
+            except Exception as e:
+                current_app.logger.error("Unexpected error %s for %s: %s", action, user_email, e)
+                return error_result('Internal error')
+        return wrapper
+    return decorator
+
+
+@lru_cache(maxsize=4096)
 def email_to_kong_username(email):
     """Convert email to Kong-compatible username"""
-    return email.split('@')[0].replace('.', '_').replace('+', '_')
+    return email.partition('@')[0].translate(_USERNAME_TABLE)
 
 
+@kong_call('getting keys', default={'keys': []})
 def get_user_api_keys(user_email):
     """
     Get API keys for a user by email
@@ -29,50 +81,48 @@ def get_user_api_keys(user_email):
     Returns:
         dict: {'success': bool, 'keys': list, 'error': str}
     """
-    try:
-        kong_api = get_kong_api()
-        kong_username = email_to_kong_username(user_email)
-        
-        keys_response, status = kong_api.get_consumer_keys(kong_username)
-        
-        if status == 200:
-            keys = keys_response.get('data', [])
-            return {
-                'success': True,
-                'keys': [
-                    {
-                        'id': key['id'],
-                        'key': key['key'],
-                        'created_at': key.get('created_at'),
-                        'consumer_id': key.get('consumer', {}).get('id')
-                    }
-                    for key in keys
-                ],
-                'count': len(keys)
-            }
-        else:
-            return {
-                'success': False,
-                'error': f'Unexpected status: {status}',
-                'keys': []
-            }
-            
-    except KongAdminAPIError as e:
-        current_app.logger.error(f"Kong API error getting keys for {user_email}: {e.message}")
+    kong_api = get_kong_api()
+    kong_username = email_to_kong_username(user_email)
+    
+    keys_response, status = kong_api.get_consumer_keys(kong_username)
+    
+    if status != 200:
         return {
             'success': False,
-            'error': f'Kong API error: {e.message}',
+            'error': f'Unexpected status: {status}',
             'keys': []
         }
-    except Exception as e:
-        current_app.logger.error(f"Unexpected error getting keys for {user_email}: {str(e)}")
-        return {
-            'success': False,
-            'error': 'Internal error',
-            'keys': []
+    
+    keys = _format_keys(keys_response.get('data', []))
+    return {
+        'success': True,
+        'keys': keys,
+        'count': len(keys)
+    }
+
+
+def _consumer_id(credential):
+    """Consumer id of a Kong credential, or None if it isn't included"""
+    try:
+        return credential['consumer']['id']
+    except (KeyError, TypeError):
+        return None
+
+
+def _format_keys(keys):
+    """Project Kong key-auth credentials to the fields the app exposes"""
+    return [
+        {
+            'id': key['id'],
+            'key': key['key'],
+            'created_at': key.get('created_at'),
+            'consumer_id': _consumer_id(key)
         }
+        for key in keys
+    ]
 
 
+@kong_call('creating key')
 def create_user_api_key(user_email, custom_key=None):
     """
     Create a new API key for a user
@@ -84,39 +134,26 @@ def create_user_api_key(user_email, custom_key=None):
     Returns:
         dict: {'success': bool, 'key': str, 'key_id': str, 'error': str}
     """
-    try:
-        kong_api = get_kong_api()
-        kong_username = email_to_kong_username(user_email)
-        
-        key_response, status = kong_api.create_consumer_key(kong_username, custom_key)
-        
-        if status == 201:
-            return {
-                'success': True,
-                'key': key_response['key'],
-                'key_id': key_response['id'],
-                'consumer_id': key_response.get('consumer', {}).get('id')
-            }
-        else:
-            return {
-                'success': False,
-                'error': f'Failed to create API key (status: {status})'
-            }
-            
-    except KongAdminAPIError as e:
-        current_app.logger.error(f"Kong API error creating key for {user_email}: {e.message}")
-        return {
-            'success': False,
-            'error': f'Kong API error: {e.message}'
-        }
-    except Exception as e:
-        current_app.logger.error(f"Unexpected error creating key for {user_email}: {str(e)}")
+    kong_api = get_kong_api()
+    kong_username = email_to_kong_username(user_email)
+    
+    key_response, status = kong_api.create_consumer_key(kong_username, custom_key)
+    
+    if status != 201:
         return {
             'success': False,
-            'error': 'Internal error'
+            'error': f'Failed to create API key (status: {status})'
         }
+    
+    return {
+        'success': True,
+        'key': key_response['key'],
+        'key_id': key_response['id'],
+        'consumer_id': _consumer_id(key_response)
+    }
 
 
+@kong_call('revoking key')
 def revoke_user_api_key(user_email, key_id):
     """
     Revoke a specific API key for a user
@@ -128,38 +165,25 @@ def revoke_user_api_key(user_email, key_id):
     Returns:
         dict: {'success': bool, 'error': str}
     """
-    try:
-        kong_api = get_kong_api()
-        kong_username = email_to_kong_username(user_email)
-        
-        response, status = kong_api.delete_consumer_key(kong_username, key_id)
-        
-        if status == 204:
-            current_app.logger.info(f"Revoked API key {key_id} for user {user_email}")
-            return {
-                'success': True,
-                'message': 'API key revoked successfully'
-            }
-        else:
-            return {
-                'success': False,
-                'error': f'Failed to revoke API key (status: {status})'
-            }
-            
-    except KongAdminAPIError as e:
-        current_app.logger.error(f"Kong API error revoking key for {user_email}: {e.message}")
-        return {
-            'success': False,
-            'error': f'Kong API error: {e.message}'
-        }
-    except Exception as e:
-        current_app.logger.error(f"Unexpected error revoking key for {user_email}: {str(e)}")
+    kong_api = get_kong_api()
+    kong_username = email_to_kong_username(user_email)
+    
+    response, status = kong_api.delete_consumer_key(kong_username, key_id)
+    
+    if status != 204:
         return {
             'success': False,
-            'error': 'Internal error'
+            'error': f'Failed to revoke API key (status: {status})'
         }
+    
+    current_app.logger.info("Revoked API key %s for user %s", key_id, user_email)
+    return {
+        'success': True,
+        'message': 'API key revoked successfully'
+    }
 
 
+@kong_call('getting info', default={'consumer': None, 'api_keys': []}, not_found='User not found in Kong')
 def get_user_kong_info(user_email):
     """
     Get complete Kong information for a user (consumer + keys)
@@ -170,58 +194,37 @@ def get_user_kong_info(user_email):
     Returns:
         dict: Complete user Kong information
     """
-    try:
-        kong_api = get_kong_api()
-        kong_username = email_to_kong_username(user_email)
-        
-        # Get consumer info
-        consumer_response, consumer_status = kong_api.get_consumer(kong_username)
-        
-        if consumer_status == 200:
-            # Get API keys
-            keys_info = get_user_api_keys(user_email)
-            
-            return {
-                'success': True,
-                'consumer': {
-                    'id': consumer_response['id'],
-                    'username': consumer_response['username'],
-                    'custom_id': consumer_response.get('custom_id'),
-                    'tags': consumer_response.get('tags', []),
-                    'created_at': consumer_response.get('created_at')
-                },
-                'api_keys': keys_info['keys'] if keys_info['success'] else [],
-                'key_count': len(keys_info['keys']) if keys_info['success'] else 0
-            }
-        else:
-            return {
-                'success': False,
-                'error': 'User not found in Kong',
-                'consumer': None,
-                'api_keys': []
-            }
-            
-    except KongAdminAPIError as e:
-        if e.status_code == 404:
-            return {
-                'success': False,
-                'error': 'User not found in Kong',
-                'consumer': None,
-                'api_keys': []
-            }
-        else:
-            current_app.logger.error(f"Kong API error getting info for {user_email}: {e.message}")
-            return {
-                'success': False,
-                'error': f'Kong API error: {e.message}',
-                'consumer': None,
-                'api_keys': []
-            }
-    except Exception as e:
-        current_app.logger.error(f"Unexpected error getting Kong info for {user_email}: {str(e)}")
+    kong_api = get_kong_api()
+    kong_username = email_to_kong_username(user_email)
+    
+    # The consumer and its keys are independent reads, so fetch both at once
+    keys_future = _lookup_executor.submit(kong_api.get_consumer_keys, kong_username)
+    consumer_response, consumer_status = kong_api.get_consumer(kong_username)
+    
+    if consumer_status != 200:
         return {
             'success': False,
-            'error': 'Internal error',
+            'error': 'User not found in Kong',
             'consumer': None,
             'api_keys': []
         }
+    
+    try:
+        keys_response, keys_status = keys_future.result()
+        api_keys = _format_keys(keys_response.get('data', [])) if keys_status == 200 else []
+    except Exception as e:
+        current_app.logger.error("Error getting keys for %s: %s", user_email, e)
+        api_keys = []
+    
+    return {
+        'success': True,
+        'consumer': {
+            'id': consumer_response['id'],
+            'username': consumer_response['username'],
+            'custom_id': consumer_response.get('custom_id'),
+            'tags': consumer_response.get('tags', []),
+            'created_at': consumer_response.get('created_at')
+        },
+        'api_keys': api_keys,
+        'key_count': len(api_keys)
+    }
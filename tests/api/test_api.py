@@ -3,10 +3,14 @@ API endpoint tests
 """
 
 import pytest
-import json
+import jwt
 from unittest.mock import patch
+from kong.kong_cache import ConsumerCache
 from tests.fixtures.sample_data import SAMPLE_USERS, OAUTH_TEST_DATA
 
+# Substrings of an OAuth provider redirect; any one is enough
+OAUTH_REDIRECT_MARKERS = ('accounts.google.com', 'oauth')
+
 class TestAPIEndpoints:
     """Test API endpoints"""
     
@@ -15,7 +19,7 @@ class TestAPIEndpoints:
         response = client.get('/api/profile')
         assert response.status_code == 401
         
-        data = json.loads(response.data)
+        data = response.get_json()
         assert 'error' in data
         assert data['error'] == 'Authentication required'
     
@@ -24,7 +28,7 @@ class TestAPIEndpoints:
         response = client.get('/api/profile', headers=auth_headers)
         assert response.status_code == 200
         
-        data = json.loads(response.data)
+        data = response.get_json()
         assert 'email' in data
         assert data['email'] == 'test.user@example.com'
     
@@ -38,7 +42,7 @@ class TestAPIEndpoints:
         response = client.get('/api/protected', headers=auth_headers)
         assert response.status_code == 200
         
-        data = json.loads(response.data)
+        data = response.get_json()
         assert 'message' in data
         assert 'user' in data
         assert 'timestamp' in data
@@ -53,15 +57,36 @@ class TestAPIEndpoints:
         response = client.get('/api/data', headers=auth_headers)
         assert response.status_code == 200
         
-        data = json.loads(response.data)
+        data = response.get_json()
         assert 'data' in data
         assert isinstance(data['data'], list)
         assert len(data['data']) > 0
     
+    def test_api_does_not_open_session(self, client, auth_headers):
+        """Test API requests skip the cookie session entirely"""
+        with client.session_transaction('/dashboard') as session:
+            session['oauth_state'] = 'test_state'
+        
+        with patch('flask.sessions.SecureCookieSessionInterface.open_session') as mock_open:
+            response = client.get('/api/profile', headers=auth_headers)
+        
+        assert response.status_code == 200
+        mock_open.assert_not_called()
+        assert 'Set-Cookie' not in response.headers
+    
     def test_api_get_auth_token_unauthorized(self, client):
         """Test get auth token endpoint without cookie authentication"""
         response = client.get('/api/get-auth-token')
         assert response.status_code == 302  # Redirect to login
+    
+    def test_api_get_auth_token_authorized(self, client, valid_jwt_token):
+        """Test get auth token endpoint returns the cookie's token"""
+        client.set_cookie('auth_token', valid_jwt_token)
+        response = client.get('/api/get-auth-token')
+        assert response.status_code == 200
+        
+        data = response.get_json()
+        assert data['token'] == valid_jwt_token
 
 class TestWebRoutes:
     """Test web routes"""
@@ -78,7 +103,84 @@ class TestWebRoutes:
         
         # Check that it redirects to Google
         location = response.headers.get('Location')
-        assert 'accounts.google.com' in location or 'oauth' in location
+        assert any(marker in location for marker in OAUTH_REDIRECT_MARKERS)
+        
+        # State travels in a signed cookie rather than the session
+        set_cookie = response.headers.get('Set-Cookie')
+        assert 'oauth_state=' in set_cookie
+        assert 'Path=/callback' in set_cookie
+        assert 'session=' not in set_cookie
+    
+    def test_login_redirect_uri_reused(self, client):
+        """Test a configured OAuth redirect URI is used without building it per login"""
+        with patch('app.app.OAUTH_REDIRECT_URI', 'https://app.example.com/callback'):
+            client.get('/login')
+            with patch('app.app.url_for') as mock_url_for:
+                response = client.get('/login')
+                assert not any(call.args[:1] == ('callback',) for call in mock_url_for.call_args_list)
+        
+        assert 'redirect_uri=https%3A%2F%2Fapp.example.com%2Fcallback' in response.headers.get('Location')
+    
+    def test_login_redirect_uri_not_reused_across_hosts(self, client):
+        """Test a forged Host on one login doesn't leak into the next login's authorization URL"""
+        with patch('app.app.OAUTH_REDIRECT_URI', None):
+            client.get('/login', headers={'Host': 'evil.example.com'})
+            response = client.get('/login')
+        
+        assert 'redirect_uri=http%3A%2F%2Flocalhost%2Fcallback' in response.headers.get('Location')
+    
+    def test_callback_url_uses_configured_redirect_uri(self, app):
+        """Test a configured OAUTH_REDIRECT_URI is used regardless of the request host"""
+        from app.app import get_callback_url
+        with patch('app.app.OAUTH_REDIRECT_URI', 'https://app.example.com/callback'), \
+             app.test_request_context('/', headers={'Host': 'evil.example.com'}):
+            assert get_callback_url() == 'https://app.example.com/callback'
+    
+    def test_callback_url_not_cached_from_first_host(self, app):
+        """Test a debug setup without OAUTH_REDIRECT_URI builds the URI from each request"""
+        from app.app import get_callback_url
+        with patch('app.app.OAUTH_REDIRECT_URI', None):
+            with app.test_request_context('/', headers={'Host': 'evil.example.com'}):
+                assert get_callback_url() == 'http://evil.example.com/callback'
+            with app.test_request_context('/', headers={'Host': 'localhost'}):
+                assert get_callback_url() == 'http://localhost/callback'
+    
+    @pytest.mark.parametrize('config,allowed', [
+        ({'DEBUG': False, 'OAUTH_REDIRECT_URI': None}, False),
+        ({'DEBUG': False, 'OAUTH_REDIRECT_URI': 'https://app.example.com/callback'}, True),
+        ({'DEBUG': True, 'OAUTH_REDIRECT_URI': None}, True),
+    ])
+    def test_redirect_uri_required_outside_debug(self, app, config, allowed):
+        """Test startup fails without OAUTH_REDIRECT_URI unless DEBUG is on"""
+        from app.app import check_oauth_redirect_uri
+        if allowed:
+            check_oauth_redirect_uri(config)
+        else:
+            with pytest.raises(RuntimeError):
+                check_oauth_redirect_uri(config)
+    
+    def test_login_state_appended_per_request(self, client):
+        """Test each login gets a fresh state on the shared authorization URL"""
+        from urllib.parse import urlsplit, parse_qs
+        from app.app import get_state_serializer
+        
+        responses = [client.get('/login'), client.get('/login')]
+        params = [parse_qs(urlsplit(r.headers['Location']).query) for r in responses]
+        
+        assert params[0]['state'] != params[1]['state']
+        assert params[0]['client_id'] == params[1]['client_id']
+        signed_state = client.get_cookie('oauth_state', path='/callback').value
+        assert get_state_serializer().loads(signed_state) == params[1]['state'][0]
+    
+    def test_public_routes_skip_session(self, app):
+        """Test the landing page and static files never open a cookie session"""
+        from flask import request
+        
+        for path in ('/', '/static/style.css', '/api/health'):
+            with app.test_request_context(path):
+                assert app.session_interface.open_session(app, request) is None
+        with app.test_request_context('/dashboard'):
+            assert app.session_interface.open_session(app, request) is not None
     
     def test_logout_route(self, client):
         """Test logout route"""
@@ -90,13 +192,11 @@ class TestWebRoutes:
         assert 'auth_token=;' in set_cookie
     
     @patch('app.app.create_or_get_kong_consumer')
-    def test_oauth_callback_success(self, mock_kong, client, mock_google_oauth):
+    def test_oauth_callback_success(self, mock_kong, client, mock_google_oauth, oauth_state):
         """Test successful OAuth callback"""
         mock_kong.return_value = 'consumer_123'
         
-        # Set up session state
-        with client.session_transaction() as session:
-            session['oauth_state'] = 'test_state_456'
+        oauth_state('test_state_456')
         
         response = client.get('/callback?code=test_code&state=test_state_456')
         
@@ -107,19 +207,85 @@ class TestWebRoutes:
         # Should set auth token cookie
         set_cookie = response.headers.get('Set-Cookie')
         assert 'auth_token=' in set_cookie
+        
+        # Should expire the single-use state cookie on its own path
+        cleared = [c for c in response.headers.getlist('Set-Cookie') if c.startswith('oauth_state=')]
+        assert cleared and 'Path=/callback' in cleared[0] and 'Max-Age=0' in cleared[0]
+    
+    @patch('app.app.kong_executor')
+    def test_oauth_callback_provisions_kong_in_background(self, mock_executor, client, mock_google_oauth, oauth_state):
+        """Test Kong provisioning is handed to the background executor"""
+        from app.app import create_or_get_kong_consumer
+        
+        oauth_state('test_state_456')
+        
+        response = client.get('/callback?code=test_code&state=test_state_456')
+        
+        assert response.status_code == 302
+        mock_executor.submit.assert_called_once_with(create_or_get_kong_consumer, 'test.user@example.com')
+    
+    @patch('app.app.create_or_get_kong_consumer')
+    def test_oauth_callback_uses_id_token_claims(self, mock_kong, client, mock_google_oauth, oauth_state):
+        """Test the user is read from the id_token without a userinfo request"""
+        from auth.auth_utils import verify_jwt_token
+        
+        oauth_state('test_state_456')
+        
+        response = client.get('/callback?code=test_code&state=test_state_456')
+        
+        assert response.status_code == 302
+        assert mock_google_oauth.token.call_count == 1
+        assert not mock_google_oauth.userinfo.called
+        with client.application.app_context():
+            user = verify_jwt_token(client.get_cookie('auth_token').value)
+        assert user['user_id'] == 'google_123456'
+        assert user['name'] == 'Test User'
+    
+    @patch('app.app.create_or_get_kong_consumer')
+    def test_oauth_callback_falls_back_to_userinfo(self, mock_kong, client, mock_google_oauth, oauth_state):
+        """Test userinfo is fetched when the token response has no id_token"""
+        del mock_google_oauth.token_response['id_token']
+        
+        oauth_state('test_state_456')
+        
+        response = client.get('/callback?code=test_code&state=test_state_456')
+        
+        assert response.status_code == 302
+        assert mock_google_oauth.userinfo.call_count == 1
+        assert mock_google_oauth.userinfo.last_request.headers['Authorization'] == 'Bearer mock_access_token'
     
-    def test_oauth_callback_invalid_state(self, client):
+    def test_oauth_callback_invalid_state(self, client, oauth_state):
         """Test OAuth callback with invalid state"""
-        with client.session_transaction() as session:
-            session['oauth_state'] = 'valid_state'
+        oauth_state('valid_state')
         
         response = client.get('/callback?code=test_code&state=invalid_state')
         assert response.status_code == 400
     
-    def test_oauth_callback_missing_code(self, client):
+    def test_oauth_callback_error_clears_state(self, client, oauth_state):
+        """Test a failed callback also expires the single-use state cookie"""
+        oauth_state('test_state_456')
+        
+        response = client.get('/callback?state=test_state_456')
+        
+        assert response.status_code == 400
+        cleared = [c for c in response.headers.getlist('Set-Cookie') if c.startswith('oauth_state=')]
+        assert cleared and 'Path=/callback' in cleared[0] and 'Max-Age=0' in cleared[0]
+    
+    def test_oauth_callback_unsigned_state(self, client):
+        """Test OAuth callback rejects a state cookie that was not signed by the app"""
+        client.set_cookie('oauth_state', 'test_state')
+        
+        response = client.get('/callback?code=test_code&state=test_state')
+        assert response.status_code == 400
+    
+    def test_oauth_callback_missing_state(self, client):
+        """Test OAuth callback without a state cookie or parameter"""
+        response = client.get('/callback?code=test_code')
+        assert response.status_code == 400
+    
+    def test_oauth_callback_missing_code(self, client, oauth_state):
         """Test OAuth callback with missing authorization code"""
-        with client.session_transaction() as session:
-            session['oauth_state'] = 'test_state'
+        oauth_state('test_state')
         
         response = client.get('/callback?state=test_state')
         assert response.status_code == 400
@@ -131,3 +297,164 @@ class TestErrorHandlers:
         """Test 404 error handler"""
         response = client.get('/nonexistent-page')
         assert response.status_code == 404
+    
+    def test_404_page_rendered_once(self, client):
+        """Test the 404 page is served from cache after the first render"""
+        first = client.get('/nonexistent-page')
+        
+        with patch('app.app.render_template') as mock_render:
+            response = client.get('/another-missing-page')
+        
+        assert response.status_code == 404
+        assert response.data == first.data
+        mock_render.assert_not_called()
+
+class TestKongProvisioning:
+    """Test Kong consumer provisioning on login"""
+    
+    @patch('app.app.kong_consumer_cache', ConsumerCache())
+    def test_new_consumer_gets_api_key(self, app, mock_kong_api):
+        """Test a newly created consumer is issued an API key"""
+        from app.app import create_or_get_kong_consumer
+        mock_kong_api.ensure_consumer.return_value = ({'id': 'consumer_123'}, 201)
+        mock_kong_api.create_consumer_key.return_value = ({'id': 'key_123', 'key': 'api_key'}, 201)
+        
+        with patch('app.app.kong_api', mock_kong_api):
+            assert create_or_get_kong_consumer('test.user@example.com') == 'consumer_123'
+        
+        mock_kong_api.ensure_consumer.assert_called_once_with(
+            'test.user@example.com', custom_id='test_user', tags=['free']
+        )
+        mock_kong_api.upsert_consumer.assert_not_called()
+        mock_kong_api.create_consumer_key.assert_called_once_with('test.user@example.com')
+    
+    @patch('app.app.kong_consumer_cache', ConsumerCache())
+    def test_existing_consumer_not_issued_api_key(self, app, mock_kong_api):
+        """Test an existing consumer - even one that revoked all its keys - isn't issued a key on login"""
+        from app.app import create_or_get_kong_consumer
+        mock_kong_api.ensure_consumer.return_value = ({'id': 'consumer_123'}, 200)
+        
+        with patch('app.app.kong_api', mock_kong_api):
+            assert create_or_get_kong_consumer('test.user@example.com') == 'consumer_123'
+        
+        mock_kong_api.get_consumer_keys.assert_not_called()
+        mock_kong_api.create_consumer_key.assert_not_called()
+    
+    @patch('app.app.kong_consumer_cache', ConsumerCache())
+    def test_existing_consumer_keeps_tags_on_login(self, app, mocked_kong):
+        """Test logging in doesn't reset an existing consumer's tier tags or custom_id"""
+        from app.app import create_or_get_kong_consumer
+        consumer = mocked_kong.consumers['consumer_123']
+        consumer.update(tags=['paid'], custom_id='renamed_user')
+        
+        assert create_or_get_kong_consumer('test.user@example.com') == 'consumer_123'
+        
+        assert consumer['tags'] == ['paid']
+        assert consumer['custom_id'] == 'renamed_user'
+        assert mocked_kong.calls('PUT') == []
+    
+    @patch('app.app.kong_consumer_cache', ConsumerCache())
+    def test_new_consumer_created_with_free_tag(self, app, mocked_kong):
+        """Test a first login creates the consumer with the default tag"""
+        from app.app import create_or_get_kong_consumer
+        
+        consumer_id = create_or_get_kong_consumer('new.user@example.com')
+        
+        assert mocked_kong.consumers[consumer_id]['tags'] == ['free']
+        assert mocked_kong.consumers[consumer_id]['custom_id'] == 'new_user'
+    
+    @patch('app.app.kong_consumer_cache', ConsumerCache())
+    def test_revoked_keys_not_reissued(self, app, mocked_kong):
+        """Test a returning user whose keys were all revoked gets no new key from provisioning"""
+        from app.app import create_or_get_kong_consumer
+        mocked_kong.keys.clear()
+        
+        assert create_or_get_kong_consumer('test.user@example.com') == 'consumer_123'
+        
+        assert mocked_kong.keys == {}
+        assert mocked_kong.calls('POST') == ['/consumers']  # Only the create attempt that got a 409
+    
+    @patch('app.app.kong_consumer_cache', ConsumerCache())
+    def test_first_login_jwt_listing_races_create(self, app, mock_kong_api, monkeypatch):
+        """Test a 404 from the overlapped jwt listing means the new consumer needs a credential"""
+        from app.app import create_or_get_kong_consumer
+        from kong.kong_admin_api import KongAdminAPIError
+        monkeypatch.setitem(app.config, 'JWT_ALGORITHM', 'EdDSA')
+        mock_kong_api.ensure_consumer.return_value = ({'id': 'consumer_123'}, 201)
+        mock_kong_api.get_consumer_jwts.side_effect = KongAdminAPIError("Not found", 404)
+        mock_kong_api.create_consumer_key.return_value = ({'id': 'key_123', 'key': 'api_key'}, 201)
+        mock_kong_api.create_consumer_jwt.return_value = ({'id': 'jwt_123'}, 201)
+        
+        with patch('app.app.kong_api', mock_kong_api):
+            assert create_or_get_kong_consumer('test.user@example.com') == 'consumer_123'
+        
+        mock_kong_api.create_consumer_key.assert_called_once_with('test.user@example.com')
+        mock_kong_api.create_consumer_jwt.assert_called_once()
+    
+    @patch('app.app.kong_consumer_cache', ConsumerCache())
+    def test_existing_consumer_gets_missing_jwt_credential(self, app, mock_kong_api, monkeypatch):
+        """Test an existing consumer without a jwt credential is issued one under EdDSA"""
+        from app.app import create_or_get_kong_consumer
+        monkeypatch.setitem(app.config, 'JWT_ALGORITHM', 'EdDSA')
+        monkeypatch.setitem(app.config, 'JWT_PUBLIC_KEY', 'public-pem')
+        mock_kong_api.ensure_consumer.return_value = ({'id': 'consumer_123'}, 200)
+        mock_kong_api.get_consumer_jwts.return_value = ({'data': [], 'next': None}, 200)
+        
+        with patch('app.app.kong_api', mock_kong_api):
+            assert create_or_get_kong_consumer('test.user@example.com') == 'consumer_123'
+        
+        mock_kong_api.create_consumer_key.assert_not_called()
+        mock_kong_api.create_consumer_jwt.assert_called_once_with(
+            'test.user@example.com', key='test.user@example.com', algorithm='EdDSA', rsa_public_key='public-pem'
+        )
+    
+    @patch('app.app.kong_consumer_cache', ConsumerCache())
+    def test_existing_jwt_credential_not_duplicated(self, app, mock_kong_api, monkeypatch):
+        """Test a consumer that already has a jwt credential is not issued another one"""
+        from app.app import create_or_get_kong_consumer
+        monkeypatch.setitem(app.config, 'JWT_ALGORITHM', 'EdDSA')
+        mock_kong_api.ensure_consumer.return_value = ({'id': 'consumer_123'}, 200)
+        mock_kong_api.get_consumer_jwts.return_value = ({'data': [{'id': 'jwt_123'}], 'next': None}, 200)
+        
+        with patch('app.app.kong_api', mock_kong_api):
+            assert create_or_get_kong_consumer('test.user@example.com') == 'consumer_123'
+        
+        mock_kong_api.get_consumer_jwts.assert_called_once_with('test.user@example.com', size=1)
+        mock_kong_api.create_consumer_jwt.assert_not_called()
+    
+    @patch('app.app.kong_executor')
+    def test_dashboard_provisions_missing_consumer(self, mock_executor, client, valid_jwt_token):
+        """Test the dashboard schedules provisioning when the consumer isn't known yet"""
+        from app.app import create_or_get_kong_consumer
+        client.set_cookie('auth_token', valid_jwt_token)
+        
+        with patch('app.app.kong_consumer_cache', ConsumerCache()):
+            response = client.get('/dashboard')
+        
+        assert response.status_code == 200
+        mock_executor.submit.assert_called_once_with(create_or_get_kong_consumer, 'test.user@example.com')
+    
+    @patch('app.app.kong_executor')
+    def test_dashboard_skips_provisioned_consumer(self, mock_executor, client, valid_jwt_token):
+        """Test the dashboard doesn't re-provision a known consumer"""
+        cache = ConsumerCache()
+        cache.get_or_set('test.user@example.com', lambda: 'consumer_123')
+        client.set_cookie('auth_token', valid_jwt_token)
+        
+        with patch('app.app.kong_consumer_cache', cache):
+            response = client.get('/dashboard')
+        
+        assert response.status_code == 200
+        mock_executor.submit.assert_not_called()
+    
+    @patch('app.app.kong_executor')
+    def test_provisioning_not_duplicated_while_in_flight(self, mock_executor, app):
+        """Test a second trigger while provisioning is running doesn't queue another task"""
+        from app.app import schedule_kong_provisioning
+        mock_executor.submit.return_value.done.return_value = False
+        
+        with patch.dict('app.app.kong_provisioning', clear=True):
+            schedule_kong_provisioning('test.user@example.com')
+            schedule_kong_provisioning('test.user@example.com')
+        
+        mock_executor.submit.assert_called_once()
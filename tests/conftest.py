@@ -5,33 +5,104 @@ Pytest configuration and fixtures for SBOM SaaS tests
 import pytest
 import sys
 import os
+import jwt
+from types import MappingProxyType
 from unittest.mock import Mock, patch
 
 # Add src to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-@pytest.fixture
+@pytest.fixture(scope='session')
 def app():
-    """Create Flask app for testing"""
+    """Configure the Flask app once for the whole test run"""
     from app.app import app
+    from auth.auth_utils import init_auth
     app.config['TESTING'] = True
     app.config['SECRET_KEY'] = 'test-secret-key'
     app.config['JWT_SECRET_KEY'] = 'test-jwt-secret'
     app.config['JWT_ALGORITHM'] = 'HS256'
     app.config['JWT_EXPIRATION_HOURS'] = 24
+    init_auth(app)
     return app
 
+@pytest.fixture(autouse=True)
+def _auth_settings(request):
+    """
+    Re-snapshot the auth settings before each test that uses the app
+    
+    Tests may monkeypatch JWT_* or TRUST_GATEWAY_AUTH and call init_auth; the
+    config is restored afterwards but the snapshot is not, so take it again here.
+    """
+    if 'app' in request.fixturenames:
+        from auth.auth_utils import init_auth
+        init_auth(request.getfixturevalue('app'))
+
+# Session methods HTTP mocks replace (requests_mock patches send, unittest.mock the verbs)
+_SESSION_METHODS = ('send', 'request', 'get', 'post')
+
+@pytest.fixture(autouse=True)
+def _no_leaked_http_mocks():
+    """Fail the test that leaves a requests.Session mock active after it finishes"""
+    import requests
+    originals = [getattr(requests.Session, name) for name in _SESSION_METHODS]
+    yield
+    leaked = [name for name, original in zip(_SESSION_METHODS, originals)
+              if getattr(requests.Session, name) is not original]
+    assert not leaked, f"requests.Session.{', '.join(leaked)} still mocked after the test"
+
 @pytest.fixture
 def client(app):
-    """Create test client"""
+    """Create test client (one per test, so cookies never leak between tests)"""
     return app.test_client()
 
 @pytest.fixture
-def mock_kong_api():
-    """Mock Kong Admin API for testing"""
-    return Mock()
+def oauth_state(client):
+    """Set a signed OAuth state cookie on the test client"""
+    def set_state(state):
+        from app.app import sign_oauth_state
+        client.set_cookie('oauth_state', sign_oauth_state(state), path='/callback')
+        return state
+    return set_state
+
+def pytest_addoption(parser):
+    parser.addoption('--live', action='store_true', default=False,
+                     help='run tests marked live against a real Kong Gateway on localhost:8001')
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'live: needs a running Kong Gateway (skipped unless --live)')
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--live'):
+        return
+    skip_live = pytest.mark.skip(reason='needs a running Kong Gateway (use --live)')
+    for item in items:
+        if 'live' in item.keywords:
+            item.add_marker(skip_live)
+
+@pytest.fixture
+def mocked_kong():
+    """In-memory Kong Admin API on http://localhost:8001, seeded with the sample consumers and keys"""
+    import requests_mock
+    from tests.fixtures.kong_mock import FakeKongAdmin
+    with requests_mock.Mocker() as mocker:
+        yield FakeKongAdmin().register(mocker)
+
+@pytest.fixture(scope='session')
+def kong_client():
+    """KongAdminAPI for http://localhost:8001 shared by the whole run, so its keep-alive pool is reused"""
+    from kong.kong_admin_api import KongAdminAPI
+    from tests.fixtures.kong_mock import KONG_ADMIN_URL
+    kong = KongAdminAPI(KONG_ADMIN_URL)
+    yield kong
+    kong.session.close()
 
 @pytest.fixture
+def mock_kong_api():
+    """Mock Kong Admin API for testing (spec'd, so misspelt methods fail loudly)"""
+    from kong.kong_admin_api import KongAdminAPI
+    return Mock(spec_set=KongAdminAPI)
+
+@pytest.fixture(scope='session')
 def sample_user_data():
     """Sample user data for testing"""
     return {
@@ -41,61 +112,71 @@ def sample_user_data():
         'picture': 'https://example.com/avatar.jpg'
     }
 
-@pytest.fixture
+@pytest.fixture(scope='session')
 def valid_jwt_token(app, sample_user_data):
     """Generate a valid JWT token for testing"""
     with app.app_context():
         from auth.auth_utils import generate_jwt_token
         return generate_jwt_token(sample_user_data)
 
-@pytest.fixture
+@pytest.fixture(scope='session')
 def auth_headers(valid_jwt_token):
     """Create authorization headers with valid token"""
     return {'Authorization': f'Bearer {valid_jwt_token}'}
 
 @pytest.fixture
-def mock_google_oauth():
-    """Mock Google OAuth responses"""
-    with patch('requests.post') as mock_post, \
-         patch('requests.get') as mock_get:
-        
-        # Mock token exchange
-        mock_post.return_value.json.return_value = {
-            'access_token': 'mock_access_token',
-            'token_type': 'Bearer'
-        }
-        mock_post.return_value.status_code = 200
-        
-        # Mock user info
-        mock_get.return_value.json.return_value = {
+def mock_google_oauth(app):
+    """
+    Mock Google's token and userinfo endpoints at the transport level
+    
+    Yields a namespace with the token/userinfo matchers (call_count, last_request)
+    and token_response, the dict returned by the token endpoint; the id_token in
+    it carries the profile claims. Requests to any other host are not stubbed.
+    """
+    import types
+    import requests_mock
+    from app.app import GOOGLE_TOKEN_URL, GOOGLE_USERINFO_URL
+    
+    token_response = {
+        'access_token': 'mock_access_token',
+        'token_type': 'Bearer',
+        'id_token': jwt.encode({
+            'sub': 'google_123456',
+            'email': 'test.user@example.com',
+            'name': 'Test User',
+            'picture': 'https://example.com/avatar.jpg'
+        }, 'google-signing-key', algorithm='HS256')
+    }
+    
+    with requests_mock.Mocker() as mocker:
+        token = mocker.post(GOOGLE_TOKEN_URL, json=lambda request, context: token_response)
+        userinfo = mocker.get(GOOGLE_USERINFO_URL, json={
             'id': 'google_123456',
             'email': 'test.user@example.com',
             'name': 'Test User',
             'picture': 'https://example.com/avatar.jpg'
-        }
-        mock_get.return_value.status_code = 200
-        
-        yield mock_post, mock_get
+        })
+        yield types.SimpleNamespace(token=token, userinfo=userinfo, token_response=token_response)
+
+# Read-only Kong responses shared by every mock_kong_success test
+_KONG_CONSUMER = MappingProxyType({'id': 'consumer_123', 'username': 'test.user@example.com'})
+_KONG_NO_KEYS = MappingProxyType({'data': (), 'next': None})
+_KONG_KEY = MappingProxyType({'id': 'key_123', 'key': 'test_api_key_123'})
 
 @pytest.fixture
 def mock_kong_success():
     """Mock successful Kong API responses"""
+    from kong.kong_admin_api import KongAdminAPI
     with patch('kong.kong_admin_api.KongAdminAPI') as mock_kong:
-        mock_instance = Mock()
+        mock_instance = Mock(spec_set=KongAdminAPI)
         
         # Mock consumer creation/retrieval
-        mock_instance.get_consumer.return_value = (
-            {'id': 'consumer_123', 'username': 'test.user@example.com'}, 
-            200
-        )
-        mock_instance.create_consumer.return_value = (
-            {'id': 'consumer_123', 'username': 'test.user@example.com'}, 
-            201
-        )
-        mock_instance.create_consumer_key.return_value = (
-            {'id': 'key_123', 'key': 'test_api_key_123'}, 
-            201
-        )
+        mock_instance.get_consumer.return_value = (_KONG_CONSUMER, 200)
+        mock_instance.create_consumer.return_value = (_KONG_CONSUMER, 201)
+        mock_instance.upsert_consumer.return_value = (_KONG_CONSUMER, 200)
+        mock_instance.ensure_consumer.return_value = (_KONG_CONSUMER, 200)
+        mock_instance.get_consumer_keys.return_value = (_KONG_NO_KEYS, 200)
+        mock_instance.create_consumer_key.return_value = (_KONG_KEY, 201)
         
         mock_kong.return_value = mock_instance
         yield mock_instance
@@ -0,0 +1,197 @@
+"""
+In-memory Kong Admin API for tests
+
+Registers requests-mock handlers for the endpoints KongAdminAPI uses, backed
+by plain dicts, so Kong tests run without a Kong Gateway on localhost:8001.
+"""
+
+import re
+import copy
+import uuid
+import time
+import threading
+from urllib.parse import unquote
+
+from tests.fixtures.sample_data import SAMPLE_KONG_CONSUMERS, SAMPLE_API_KEYS
+
+KONG_ADMIN_URL = 'http://localhost:8001'
+
+
+class FakeKongAdmin:
+    """
+    Minimal stateful Kong Admin API (consumers, key-auth and jwt credentials)
+
+    Example usage:
+        with requests_mock.Mocker() as mocker:
+            kong = FakeKongAdmin().register(mocker)
+            KongAdminAPI(KONG_ADMIN_URL).create_consumer("alice@example.com")
+            assert "alice@example.com" in kong.usernames()
+    """
+
+    def __init__(self, consumers=SAMPLE_KONG_CONSUMERS, keys=SAMPLE_API_KEYS):
+        # consumer id -> consumer, key id -> credential (with consumer: {id})
+        self.consumers = {c['id']: copy.deepcopy(c) for c in consumers}
+        self.keys = {k['id']: copy.deepcopy(k) for k in keys}
+        self.jwts = {}
+        self._lock = threading.Lock()
+        self.mocker = None
+
+    def usernames(self):
+        """Usernames of all stored consumers"""
+        return {c.get('username') for c in self.consumers.values()}
+
+    def calls(self, method):
+        """Paths requested with method so far, in order"""
+        return [r.path for r in self.mocker.request_history if r.method == method]
+
+    def register(self, mocker, base_url=KONG_ADMIN_URL):
+        """Register this fake's handlers on a requests_mock.Mocker and return self"""
+        self.mocker = mocker
+        base = re.escape(base_url.rstrip('/'))
+        segment = r'([^/?]+)'
+        routes = [
+            ('GET', r'/status', self._status),
+            ('GET', r'/consumers', self._list_consumers),
+            ('POST', r'/consumers', self._create_consumer),
+            ('GET', rf'/consumers/{segment}', self._get_consumer),
+            ('PUT', rf'/consumers/{segment}', self._upsert_consumer),
+            ('DELETE', rf'/consumers/{segment}', self._delete_consumer),
+            ('GET', rf'/consumers/{segment}/key-auth', self._list_keys),
+            ('POST', rf'/consumers/{segment}/key-auth', self._create_key),
+            ('DELETE', rf'/consumers/{segment}/key-auth/{segment}', self._delete_key),
+            ('GET', rf'/consumers/{segment}/jwt', self._list_jwts),
+            ('POST', rf'/consumers/{segment}/jwt', self._create_jwt),
+        ]
+        for method, path, handler in routes:
+            pattern = re.compile(rf'^{base}{path}(\?.*)?$')
+            mocker.register_uri(method, pattern, json=self._wrap(pattern, handler))
+        return self
+
+    def _wrap(self, pattern, handler):
+        def callback(request, context):
+            args = [unquote(arg) for arg in pattern.match(request.url).groups()[:-1]]
+            body = request.json() if request.body else {}
+            with self._lock:
+                status, payload = handler(request, body, *args)
+            context.status_code = status
+            return payload
+        return callback
+
+    # Lookups
+
+    def _find_consumer(self, username_or_id):
+        consumer = self.consumers.get(username_or_id)
+        if consumer is None:
+            consumer = next((c for c in self.consumers.values() if c.get('username') == username_or_id), None)
+        return consumer
+
+    @staticmethod
+    def _not_found():
+        return 404, {'message': 'Not found'}
+
+    @staticmethod
+    def _page(items, request):
+        """Apply Kong's size/offset pagination (the offset is the next item's index)"""
+        size = int(request.qs.get('size', ['100'])[0])
+        start = int(request.qs.get('offset', ['0'])[0])
+        page = items[start:start + size]
+        result = {'data': page, 'next': None}
+        if start + size < len(items):
+            result['offset'] = str(start + size)
+        return result
+
+    # Handlers
+
+    def _status(self, request, body):
+        return 200, {'database': {'reachable': True}, 'server': {'connections_active': 1}}
+
+    def _list_consumers(self, request, body):
+        consumers = list(self.consumers.values())
+        tags = request.qs.get('tags')
+        if tags:
+            wanted = set(tags[0].split(','))
+            consumers = [c for c in consumers if wanted <= set(c.get('tags') or ())]
+        return 200, self._page(consumers, request)
+
+    def _create_consumer(self, request, body):
+        for consumer in self.consumers.values():
+            if body.get('username') and consumer.get('username') == body['username']:
+                return 409, {'message': 'UNIQUE violation detected on \'{username="%s"}\'' % body['username']}
+        consumer = {
+            'id': str(uuid.uuid4()),
+            'username': body.get('username'),
+            'custom_id': body.get('custom_id'),
+            'tags': body.get('tags'),
+            'created_at': int(time.time())
+        }
+        self.consumers[consumer['id']] = consumer
+        return 201, consumer
+
+    def _get_consumer(self, request, body, username_or_id):
+        consumer = self._find_consumer(username_or_id)
+        return (200, consumer) if consumer else self._not_found()
+
+    def _upsert_consumer(self, request, body, username):
+        consumer = self._find_consumer(username)
+        if consumer is None:
+            status, consumer = self._create_consumer(request, dict(body, username=username))
+            return 200, consumer
+        consumer.update({k: v for k, v in body.items() if k in ('custom_id', 'tags')})
+        return 200, consumer
+
+    def _delete_consumer(self, request, body, username_or_id):
+        consumer = self._find_consumer(username_or_id)
+        if consumer is None:
+            return self._not_found()
+        del self.consumers[consumer['id']]
+        # Kong cascades consumer deletes to their credentials
+        for store in (self.keys, self.jwts):
+            for key_id in [k for k, v in store.items() if v['consumer']['id'] == consumer['id']]:
+                del store[key_id]
+        return 204, None
+
+    def _list_keys(self, request, body, username_or_id):
+        consumer = self._find_consumer(username_or_id)
+        if consumer is None:
+            return self._not_found()
+        keys = [k for k in self.keys.values() if k['consumer']['id'] == consumer['id']]
+        return 200, self._page(keys, request)
+
+    def _create_key(self, request, body, username_or_id):
+        consumer = self._find_consumer(username_or_id)
+        if consumer is None:
+            return self._not_found()
+        key = body.get('key') or uuid.uuid4().hex
+        if any(k['key'] == key for k in self.keys.values()):
+            return 409, {'message': 'UNIQUE violation detected on \'{key="%s"}\'' % key}
+        credential = {
+            'id': str(uuid.uuid4()),
+            'key': key,
+            'consumer': {'id': consumer['id']},
+            'created_at': int(time.time())
+        }
+        self.keys[credential['id']] = credential
+        return 201, credential
+
+    def _delete_key(self, request, body, username_or_id, key_id):
+        consumer = self._find_consumer(username_or_id)
+        key = self.keys.get(key_id)
+        if consumer is None or key is None or key['consumer']['id'] != consumer['id']:
+            return self._not_found()
+        del self.keys[key_id]
+        return 204, None
+
+    def _list_jwts(self, request, body, username_or_id):
+        consumer = self._find_consumer(username_or_id)
+        if consumer is None:
+            return self._not_found()
+        jwts = [j for j in self.jwts.values() if j['consumer']['id'] == consumer['id']]
+        return 200, self._page(jwts, request)
+
+    def _create_jwt(self, request, body, username_or_id):
+        consumer = self._find_consumer(username_or_id)
+        if consumer is None:
+            return self._not_found()
+        credential = dict(body, id=str(uuid.uuid4()), consumer={'id': consumer['id']})
+        self.jwts[credential['id']] = credential
+        return 201, credential
@@ -7,8 +7,12 @@ This demonstrates server-to-server communication with Kong Gateway
 import logging
 import sys
 import time
+import pytest
+from functools import partial
 from kong.kong_admin_api import KongAdminAPI, KongAdminAPIError
 
+KONG_ADMIN_URL = "http://localhost:8001/"
+
 
 def setup_logging():
     """Configure logging for testing"""
@@ -18,28 +22,37 @@ def setup_logging():
     )
 
 
-def test_kong_admin_api():
-    """Test Kong Admin API basic functionality"""
-    
-    print("🔍 Testing Kong Admin API...")
+def check_kong_admin_api(kong):
+    """
+    Exercise Kong Admin API basic functionality, returning True if every step succeeded
     
-    # Initialize Kong API client
-    kong = KongAdminAPI("http://localhost:8001/")
+    The report is collected and printed in one write when the check finishes.
+    """
+    lines = []
+    try:
+        return _check_kong_admin_api(kong, lines.append)
+    finally:
+        print("\n".join(lines))
+
+
+def _check_kong_admin_api(kong, emit):
+    emit("🔍 Testing Kong Admin API...")
     
     # Test with email-like username to match OAuth pattern
-    test_username = f"test-user-{int(time.time())}@example.com"
-    test_custom_id = f"test_user_{int(time.time())}"
+    suffix = time.time_ns()
+    test_username = f"test-user-{suffix}@example.com"
+    test_custom_id = f"test_user_{suffix}"
     
     try:
         # Test 1: Health check
-        print(f"\n1️⃣ Health Check:")
+        emit(f"\n1️⃣ Health Check:")
         health, status = kong.health_check()
-        print(f"   ✅ Kong API Status: {status}")
+        emit(f"   ✅ Kong API Status: {status}")
         if status == 200:
-            print(f"   ✅ Kong is healthy")
+            emit(f"   ✅ Kong is healthy")
         
         # Test 2: Create consumer (matching OAuth pattern)
-        print(f"\n2️⃣ Creating consumer with email-like username '{test_username}':")
+        emit(f"\n2️⃣ Creating consumer with email-like username '{test_username}':")
         consumer, status = kong.create_consumer(
             username=test_username,  # Email-like username
             custom_id=test_custom_id,  # Sanitized custom_id
@@ -48,92 +61,117 @@ def test_kong_admin_api():
         
         if status == 201:
             consumer_id = consumer['id']
-            print(f"   ✅ Created consumer with ID: {consumer_id}")
-            print(f"   📧 Username (email): {consumer['username']}")
-            print(f"   🔖 Custom ID (sanitized): {consumer['custom_id']}")
+            emit(f"   ✅ Created consumer with ID: {consumer_id}")
+            emit(f"   📧 Username (email): {consumer['username']}")
+            emit(f"   🔖 Custom ID (sanitized): {consumer['custom_id']}")
         else:
-            print(f"   ❌ Failed to create consumer: {status}")
+            emit(f"   ❌ Failed to create consumer: {status}")
             return False
         
+        # Tests 3-5 are independent reads/writes on the new consumer, so send them together
+        custom_key = f"test-key-{suffix}"
+        consumer_info, key_result, custom_key_result = kong.map_concurrent(
+            lambda call: call(),
+            [
+                partial(kong.get_consumer, test_username),
+                partial(kong.create_consumer_key, test_username),
+                partial(kong.create_consumer_key, test_username, custom_key),
+            ]
+        )
+        
         # Test 3: Get consumer by email (username)
-        print(f"\n3️⃣ Getting consumer by email '{test_username}':")
-        consumer_info, status = kong.get_consumer(test_username)
+        emit(f"\n3️⃣ Getting consumer by email '{test_username}':")
+        if isinstance(consumer_info, Exception):
+            raise consumer_info
+        consumer_info, status = consumer_info
         if status == 200:
-            print(f"   ✅ Found consumer: {consumer_info['username']} (ID: {consumer_info['id']})")
-            print(f"   🔖 Custom ID: {consumer_info.get('custom_id', 'N/A')}")
+            emit(f"   ✅ Found consumer: {consumer_info['username']} (ID: {consumer_info['id']})")
+            emit(f"   🔖 Custom ID: {consumer_info.get('custom_id', 'N/A')}")
         
         # Test 4: Create API key using email (username)
-        print(f"\n4️⃣ Creating auto-generated API key for email username:")
-        key_response, status = kong.create_consumer_key(test_username)
+        emit(f"\n4️⃣ Creating auto-generated API key for email username:")
+        if isinstance(key_result, Exception):
+            raise key_result
+        key_response, status = key_result
         if status == 201:
             api_key = key_response['key']
             key_id = key_response['id']
-            print(f"   ✅ Created key: {api_key[:12]}***")
+            emit(f"   ✅ Created key: {api_key[:12]}***")
         else:
-            print(f"   ⚠️  Failed to create key (key-auth plugin may not be enabled): {status}")
+            emit(f"   ⚠️  Failed to create key (key-auth plugin may not be enabled): {status}")
             key_id = None
         
         # Test 5: Create custom API key
-        print(f"\n5️⃣ Creating custom API key:")
-        custom_key = f"test-key-{int(time.time())}"
-        try:
-            key_response2, status = kong.create_consumer_key(test_username, custom_key)
+        emit(f"\n5️⃣ Creating custom API key:")
+        if isinstance(custom_key_result, KongAdminAPIError) and custom_key_result.status_code == 400:
+            emit(f"   ⚠️  Custom key failed (may be duplicate or invalid): {custom_key_result.message}")
+        elif isinstance(custom_key_result, Exception):
+            raise custom_key_result
+        else:
+            key_response2, status = custom_key_result
             if status == 201:
-                print(f"   ✅ Created custom key: {key_response2['key']}")
-        except KongAdminAPIError as e:
-            if e.status_code == 400:
-                print(f"   ⚠️  Custom key failed (may be duplicate or invalid): {e.message}")
-            else:
-                raise
+                emit(f"   ✅ Created custom key: {key_response2['key']}")
         
         # Test 6: Get all keys using email (username)
-        print(f"\n6️⃣ Getting all API keys for email username:")
+        emit(f"\n6️⃣ Getting all API keys for email username:")
         keys_response, status = kong.get_consumer_keys(test_username)
         if status == 200:
             keys = keys_response.get('data', [])
-            print(f"   ✅ Found {len(keys)} keys for consumer")
+            emit(f"   ✅ Found {len(keys)} keys for consumer")
             for i, key in enumerate(keys, 1):
-                print(f"      Key {i}: {key['key'][:12]}*** (ID: {key['id']})")
+                emit(f"      Key {i}: {key['key'][:12]}*** (ID: {key['id']})")
         
         # Test 7: Check if consumer exists by email
-        print(f"\n7️⃣ Testing consumer existence by email:")
+        emit(f"\n7️⃣ Testing consumer existence by email:")
         exists = kong.consumer_exists(test_username)
-        print(f"   ✅ Consumer exists: {exists}")
+        emit(f"   ✅ Consumer exists: {exists}")
         
         # Test 8: Delete a key (if we have one)
         if key_id:
-            print(f"\n8️⃣ Deleting API key:")
+            emit(f"\n8️⃣ Deleting API key:")
             delete_response, status = kong.delete_consumer_key(test_username, key_id)
             if status == 204:
-                print(f"   ✅ Successfully deleted key {key_id}")
+                emit(f"   ✅ Successfully deleted key {key_id}")
         
         # Test 9: Error handling - try to get non-existent consumer
-        print(f"\n9️⃣ Testing error handling:")
+        emit(f"\n9️⃣ Testing error handling:")
         try:
             kong.get_consumer("non-existent@example.com")
         except KongAdminAPIError as e:
-            print(f"   ✅ Correctly caught 404 error: {e.message}")
+            emit(f"   ✅ Correctly caught 404 error: {e.message}")
         
         # Cleanup: Delete test consumer using email (username)
-        print(f"\n🧹 Cleanup - Deleting test consumer by email:")
+        emit(f"\n🧹 Cleanup - Deleting test consumer by email:")
         delete_response, status = kong.delete_consumer(test_username)
         if status == 204:
-            print(f"   ✅ Successfully deleted consumer {test_username}")
+            emit(f"   ✅ Successfully deleted consumer {test_username}")
         
-        print(f"\n🎉 All Kong Admin API tests completed successfully!")
-        print(f"   📧 OAuth pattern validated: email as username, sanitized as custom_id")
+        emit(f"\n🎉 All Kong Admin API tests completed successfully!")
+        emit(f"   📧 OAuth pattern validated: email as username, sanitized as custom_id")
         return True
         
     except KongAdminAPIError as e:
-        print(f"\n❌ Kong API Error: {e}")
-        print(f"   Status Code: {e.status_code}")
-        print(f"   Response: {e.response_data}")
+        emit(f"\n❌ Kong API Error: {e}")
+        emit(f"   Status Code: {e.status_code}")
+        emit(f"   Response: {e.response_data}")
         return False
     except Exception as e:
-        print(f"\n❌ Unexpected error: {e}")
+        emit(f"\n❌ Unexpected error: {e}")
         return False
 
 
+def test_kong_admin_api(mocked_kong, kong_client):
+    """Test Kong Admin API basic functionality (in-memory Kong)"""
+    assert check_kong_admin_api(kong_client)
+
+
+@pytest.mark.live
+def test_kong_admin_api_live(kong_client):
+    """Test Kong Admin API basic functionality against a running Kong"""
+    setup_logging()
+    assert check_kong_admin_api(kong_client)
+
+
 def main():
     """Main test runner"""
     setup_logging()
@@ -143,7 +181,7 @@ def main():
     print("=" * 60)
     
     # Test basic API functionality
-    api_success = test_kong_admin_api()
+    api_success = check_kong_admin_api(KongAdminAPI(KONG_ADMIN_URL))
     
     print("\n" + "=" * 60)
     if api_success:
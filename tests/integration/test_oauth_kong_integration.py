@@ -6,105 +6,200 @@ This simulates the OAuth flow and tests Kong consumer creation
 
 import sys
 import logging
+import pytest
+from functools import partial
 from kong.kong_admin_api import KongAdminAPI, KongAdminAPIError
+from kong.kong_utils import email_to_kong_username
+from tests.fixtures.sample_data import SAMPLE_KONG_CONSUMERS
 
-def test_kong_user_creation():
-    """Test creating Kong consumers for OAuth users"""
+KONG_ADMIN_URL = "http://localhost:8001"
+
+# Simulate user data from OAuth callback
+TEST_USERS = [
+    {
+        'email': 'test.user@example.com',
+        'name': 'Test User',
+        'id': 'google_123456'
+    },
+    {
+        'email': 'jane.doe+work@company.com',
+        'name': 'Jane Doe',
+        'id': 'google_789012'
+    }
+]
+
+# Tags put on the consumers created here; the first two identify OAuth users in a lookup
+TEST_CONSUMER_TAGS = ["sbom-saas", "oauth-user", "auto-created", "test"]
+TEST_LOOKUP_TAGS = TEST_CONSUMER_TAGS[:2]
+
+def provision_test_user(kong_api, user_info, known_consumers=None):
+    """
+    Ensure a Kong consumer (with an API key) exists for one OAuth user
     
-    logging.basicConfig(level=logging.INFO)
+    Args:
+        kong_api: KongAdminAPI client
+        user_info: OAuth user data (email, name, id)
+        known_consumers: username -> id of the test consumers listed up front; users
+            missing from it are created without a lookup (None: look up each user)
     
-    # Initialize Kong API
-    kong_api = KongAdminAPI("http://localhost:8001")
-    
-    # Simulate user data from OAuth callback
-    test_users = [
-        {
-            'email': 'test.user@example.com',
-            'name': 'Test User',
-            'id': 'google_123456'
-        },
-        {
-            'email': 'jane.doe+work@company.com',
-            'name': 'Jane Doe',
-            'id': 'google_789012'
-        }
-    ]
+    Returns:
+        tuple: (Kong consumer id or None, list of report lines)
+    """
+    email = user_info['email']
+    lines = [f"\n👤 Processing user: {email}"]
     
-    print("🧪 Testing Kong OAuth User Integration...")
-    
-    for user_info in test_users:
-        print(f"\n👤 Processing user: {user_info['email']}")
+    try:
+        # Updated logic: email as username, sanitized username as custom_id
+        kong_username_sanitized = email_to_kong_username(email)
+        lines.append(f"   Kong username (email): {email}")
+        lines.append(f"   Kong custom_id (sanitized): {kong_username_sanitized}")
         
-        try:
-            # Updated logic: email as username, sanitized username as custom_id
-            kong_username_sanitized = user_info['email'].split('@')[0].replace('.', '_').replace('+', '_')
-            print(f"   Kong username (email): {user_info['email']}")
-            print(f"   Kong custom_id (sanitized): {kong_username_sanitized}")
-            
+        if known_consumers is not None:
+            kong_consumer_id = known_consumers.get(email)
+        else:
             # Check if consumer already exists (using email as username)
             try:
-                existing_consumer, status = kong_api.get_consumer(user_info['email'])
-                if status == 200:
-                    print(f"   ✅ Consumer already exists: {existing_consumer['id']}")
-                    kong_consumer_id = existing_consumer['id']
-                else:
-                    raise KongAdminAPIError("Unexpected status", status)
-                    
+                existing_consumer, status = kong_api.get_consumer(email)
+                kong_consumer_id = existing_consumer['id']
             except KongAdminAPIError as e:
-                if e.status_code == 404:
-                    # Consumer doesn't exist, create it
-                    print(f"   🔄 Creating new Kong consumer...")
-                    consumer_response, status = kong_api.create_consumer(
-                        username=user_info['email'],  # Use email as username
-                        custom_id=kong_username_sanitized,  # Use sanitized username as custom_id
-                        tags=["sbom-saas", "oauth-user", "auto-created", "test"]
-                    )
+                if e.status_code != 404:
+                    raise
+                kong_consumer_id = None
+        
+        if kong_consumer_id:
+            lines.append(f"   ✅ Consumer already exists: {kong_consumer_id}")
+        else:
+            lines.append(f"   🔄 Creating new Kong consumer...")
+            try:
+                consumer_response, status = kong_api.create_consumer(
+                    username=email,  # Use email as username
+                    custom_id=kong_username_sanitized,  # Use sanitized username as custom_id
+                    tags=TEST_CONSUMER_TAGS
+                )
+            except KongAdminAPIError as e:
+                if e.status_code != 409:
+                    raise
+                # Exists without the test tags, so it was not in known_consumers
+                existing_consumer, status = kong_api.get_consumer(email)
+                kong_consumer_id = existing_consumer['id']
+                lines.append(f"   ✅ Consumer already exists: {kong_consumer_id}")
+            else:
+                if status == 201:
+                    kong_consumer_id = consumer_response['id']
+                    lines.append(f"   ✅ Created Kong consumer: {kong_consumer_id}")
                     
-                    if status == 201:
-                        kong_consumer_id = consumer_response['id']
-                        print(f"   ✅ Created Kong consumer: {kong_consumer_id}")
-                        
-                        # Create an API key for the user (using email as username)
-                        try:
-                            key_response, key_status = kong_api.create_consumer_key(user_info['email'])
-                            if key_status == 201:
-                                api_key = key_response['key']
-                                print(f"   ✅ Created API key: {api_key[:12]}***")
-                            else:
-                                print(f"   ⚠️  Failed to create API key (status: {key_status})")
-                        except KongAdminAPIError as key_error:
-                            print(f"   ⚠️  Failed to create API key: {key_error.message}")
-                    else:
-                        print(f"   ❌ Failed to create Kong consumer (status: {status})")
-                        kong_consumer_id = None
+                    # Create an API key for the user (using email as username)
+                    try:
+                        key_response, key_status = kong_api.create_consumer_key(email)
+                        if key_status == 201:
+                            api_key = key_response['key']
+                            lines.append(f"   ✅ Created API key: {api_key[:12]}***")
+                        else:
+                            lines.append(f"   ⚠️  Failed to create API key (status: {key_status})")
+                    except KongAdminAPIError as key_error:
+                        lines.append(f"   ⚠️  Failed to create API key: {key_error.message}")
                 else:
-                    print(f"   ❌ Kong API error: {e.message}")
-                    kong_consumer_id = None
+                    lines.append(f"   ❌ Failed to create Kong consumer (status: {status})")
+        
+        if kong_consumer_id:
+            lines.append(f"   ✅ User {email} has Kong consumer: {kong_consumer_id}")
+        else:
+            lines.append(f"   ❌ Failed to ensure Kong consumer for {email}")
             
-            if kong_consumer_id:
-                print(f"   ✅ User {user_info['email']} has Kong consumer: {kong_consumer_id}")
-            else:
-                print(f"   ❌ Failed to ensure Kong consumer for {user_info['email']}")
-                
-        except Exception as e:
-            print(f"   ❌ Unexpected error for user {user_info['email']}: {str(e)}")
-    
-    print(f"\n🧹 Cleanup - Removing test consumers:")
-    for user_info in test_users:
-        # Use email as username for deletion
-        try:
-            delete_response, status = kong_api.delete_consumer(user_info['email'])
-            if status == 204:
-                print(f"   ✅ Deleted test consumer: {user_info['email']}")
-            else:
-                print(f"   ⚠️  Failed to delete consumer {user_info['email']} (status: {status})")
-        except KongAdminAPIError as e:
-            if e.status_code == 404:
-                print(f"   ℹ️  Consumer {user_info['email']} not found (already deleted)")
-            else:
-                print(f"   ❌ Error deleting consumer {user_info['email']}: {e.message}")
+    except KongAdminAPIError as e:
+        lines.append(f"   ❌ Kong API error: {e.message}")
+        kong_consumer_id = None
+    except Exception as e:
+        lines.append(f"   ❌ Unexpected error for user {email}: {str(e)}")
+        kong_consumer_id = None
+    
+    return kong_consumer_id, lines
+
+def list_test_consumers(kong_api):
+    """
+    Map username -> id for consumers carrying the test tags, in one paginated listing
+    
+    Returns:
+        dict, or None if Kong could not be listed (callers then look up each user)
+    """
+    try:
+        return {c['username']: c['id'] for c in kong_api.iter_consumers(tags=TEST_LOOKUP_TAGS)}
+    except Exception as e:
+        print(f"   ⚠️  Could not list test consumers, looking up each user: {e}")
+        return None
+
+def remove_test_user(kong_api, user_info):
+    """Delete one test user's Kong consumer, returning a report line"""
+    # Use email as username for deletion
+    try:
+        delete_response, status = kong_api.delete_consumer(user_info['email'])
+        if status == 204:
+            return f"   ✅ Deleted test consumer: {user_info['email']}"
+        return f"   ⚠️  Failed to delete consumer {user_info['email']} (status: {status})"
+    except KongAdminAPIError as e:
+        if e.status_code == 404:
+            return f"   ℹ️  Consumer {user_info['email']} not found (already deleted)"
+        return f"   ❌ Error deleting consumer {user_info['email']}: {e.message}"
+
+def check_kong_user_creation(kong_api, test_users=TEST_USERS):
+    """
+    Ensure a Kong consumer exists for each OAuth user, then remove them again
+    
+    Users are independent, so they are provisioned (and removed) concurrently;
+    report lines are printed afterwards in user order. Cleanup runs even if
+    provisioning raised.
+    
+    Returns:
+        dict: email -> Kong consumer id (None where provisioning failed)
+    """
+    results = {}
+    
+    print("🧪 Testing Kong OAuth User Integration...")
+    
+    try:
+        known_consumers = list_test_consumers(kong_api)
+        outcomes = kong_api.map_concurrent(
+            partial(provision_test_user, kong_api, known_consumers=known_consumers), test_users
+        )
+        for user_info, (kong_consumer_id, lines) in zip(test_users, outcomes):
+            print("\n".join(lines))
+            results[user_info['email']] = kong_consumer_id
+    finally:
+        print(f"\n🧹 Cleanup - Removing test consumers:")
+        for line in kong_api.map_concurrent(partial(remove_test_user, kong_api), test_users):
+            print(line)
     
     print(f"\n🎉 Kong OAuth integration test completed!")
+    return results
+
+@pytest.mark.parametrize('user', TEST_USERS, ids=[user['email'] for user in TEST_USERS])
+def test_kong_user_creation(user, mocked_kong, kong_client):
+    """Test creating a Kong consumer for an OAuth user (in-memory Kong)"""
+    results = check_kong_user_creation(kong_client, [user])
+    
+    assert results[user['email']]
+    assert not set(results) & mocked_kong.usernames()
+
+def test_kong_user_creation_skips_lookups(mocked_kong, kong_client):
+    """Test users missing from the tagged consumer listing are created without a GET each"""
+    new_users = [
+        {'email': 'new.user@example.com', 'name': 'New User', 'id': 'google_111'},
+        {'email': 'other+tag@example.com', 'name': 'Other User', 'id': 'google_222'}
+    ]
+    
+    results = check_kong_user_creation(kong_client, new_users)
+    
+    assert all(results.values())
+    assert mocked_kong.calls('GET') == ['/consumers']
+    assert not set(results) & mocked_kong.usernames()
+
+@pytest.mark.live
+def test_kong_user_creation_live(kong_client):
+    """Test creating Kong consumers for OAuth users against a running Kong"""
+    logging.basicConfig(level=logging.INFO)
+    results = check_kong_user_creation(kong_client)
+    
+    assert all(results.values())
 
 def test_username_conversion():
     """Test email to Kong username conversion logic"""
@@ -120,15 +215,22 @@ def test_username_conversion():
         'simple@test.io'
     ]
     
-    for email in test_emails:
-        kong_username_sanitized = email.split('@')[0].replace('.', '_').replace('+', '_')
-        print(f"   {email} → username: {email}, custom_id: {kong_username_sanitized}")
+    print("\n".join(
+        f"   {email} → username: {email}, custom_id: {email_to_kong_username(email)}"
+        for email in test_emails
+    ))
+
+@pytest.mark.parametrize('consumer', SAMPLE_KONG_CONSUMERS, ids=[c['username'] for c in SAMPLE_KONG_CONSUMERS])
+def test_sample_consumer_custom_id(consumer):
+    """Test the sample consumers' custom_ids follow the email to Kong username rule"""
+    assert email_to_kong_username(consumer['username']) == consumer['custom_id']
 
 if __name__ == "__main__":
     test_username_conversion()
     
     try:
-        test_kong_user_creation()
+        logging.basicConfig(level=logging.INFO)
+        check_kong_user_creation(KongAdminAPI(KONG_ADMIN_URL))
     except Exception as e:
         print(f"\n❌ Test failed: {e}")
         print("\n💡 Make sure Kong Gateway is running on localhost:8001")
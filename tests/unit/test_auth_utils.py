@@ -6,108 +6,270 @@ import pytest
 import jwt
 import datetime
 from unittest.mock import Mock, patch
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519
 from auth.auth_utils import (
     generate_jwt_token, 
     verify_jwt_token, 
     get_user_from_cookie, 
-    get_user_from_header
+    get_user_from_header,
+    clear_token_cache,
+    init_auth
 )
 
+@pytest.fixture(scope='class')
+def app_context(app):
+    """One app context for a whole test class (for tests that never touch request state or g)"""
+    with app.app_context():
+        yield
+
+@pytest.mark.usefixtures('app_context')
 class TestJWTFunctions:
     """Test JWT generation and verification functions"""
     
     def test_generate_jwt_token(self, app, sample_user_data):
         """Test JWT token generation"""
-        with app.app_context():
-            token = generate_jwt_token(sample_user_data)
-            
-            assert token is not None
-            assert isinstance(token, str)
-            assert len(token) > 50  # JWT tokens are typically long
-    
-    def test_verify_jwt_token_valid(self, app, sample_user_data):
-        """Test JWT token verification with valid token"""
-        with app.app_context():
-            token = generate_jwt_token(sample_user_data)
-            payload = verify_jwt_token(token)
-            
-            assert payload is not None
-            assert payload['email'] == sample_user_data['email']
-            assert payload['name'] == sample_user_data['name']
-            assert payload['user_id'] == sample_user_data['sub']
+        token = generate_jwt_token(sample_user_data)
+        
+        assert token is not None
+        assert isinstance(token, str)
+        assert len(token) > 50  # JWT tokens are typically long
+        
+        # Claim shape only - the signature path is covered by test_verify_jwt_token_valid_signature
+        payload = jwt.decode(token, options={'verify_signature': False, 'verify_exp': False})
+        assert payload['user_id'] == sample_user_data['sub']
+        assert payload['picture'] == sample_user_data['picture']
+        assert payload['iss'] == sample_user_data['email']  # Kong jwt plugin's default key claim
+        assert payload['exp'] - payload['iat'] == app.config['JWT_EXPIRATION_HOURS'] * 3600
+    
+    def test_verify_jwt_token_valid_signature(self, app, sample_user_data):
+        """Test JWT token verification with a validly signed token"""
+        token = generate_jwt_token(sample_user_data)
+        payload = verify_jwt_token(token)
+        
+        assert payload is not None
+        assert payload['email'] == sample_user_data['email']
+        assert payload['name'] == sample_user_data['name']
+        assert payload['user_id'] == sample_user_data['sub']
     
     def test_verify_jwt_token_invalid(self, app):
         """Test JWT token verification with invalid token"""
-        with app.app_context():
-            payload = verify_jwt_token('invalid_token')
-            assert payload is None
+        payload = verify_jwt_token('invalid_token')
+        assert payload is None
     
     def test_verify_jwt_token_expired(self, app, sample_user_data):
         """Test JWT token verification with expired token"""
-        with app.app_context():
-            # Create expired token manually
-            expired_payload = {
-                'user_id': sample_user_data['sub'],
-                'email': sample_user_data['email'],
-                'name': sample_user_data['name'],
-                'exp': datetime.datetime.utcnow() - datetime.timedelta(hours=1),  # Expired
-                'iat': datetime.datetime.utcnow() - datetime.timedelta(hours=2)
-            }
-            expired_token = jwt.encode(
-                expired_payload, 
-                app.config['JWT_SECRET_KEY'], 
-                algorithm=app.config['JWT_ALGORITHM']
-            )
-            
-            payload = verify_jwt_token(expired_token)
-            assert payload is None
+        # Create expired token manually
+        expired_payload = {
+            'user_id': sample_user_data['sub'],
+            'email': sample_user_data['email'],
+            'name': sample_user_data['name'],
+            'exp': 1000000000,  # Expired (2001-09-09)
+            'iat': 999992800
+        }
+        expired_token = jwt.encode(
+            expired_payload, 
+            app.config['JWT_SECRET_KEY'], 
+            algorithm=app.config['JWT_ALGORITHM']
+        )
+        
+        payload = verify_jwt_token(expired_token)
+        assert payload is None
+    
+    def test_jwt_token_pyjwt_compatible(self, app, sample_user_data, valid_jwt_token):
+        """Test tokens interoperate with PyJWT in both directions"""
+        secret = app.config['JWT_SECRET_KEY']
+        decoded = jwt.decode(valid_jwt_token, secret, algorithms=['HS256'])
+        assert decoded['email'] == sample_user_data['email']
+        
+        pyjwt_token = jwt.encode(
+            {'email': sample_user_data['email'], 'exp': decoded['exp']},
+            secret,
+            algorithm='HS256'
+        )
+        assert verify_jwt_token(pyjwt_token)['email'] == sample_user_data['email']
+    
+    def test_verify_jwt_token_bad_signature(self, app, sample_user_data):
+        """Test tokens signed with a different secret are rejected"""
+        forged = jwt.encode({'email': sample_user_data['email']}, 'other-secret', algorithm='HS256')
+        assert verify_jwt_token(forged) is None
+    
+    def test_verify_jwt_token_requires_exp(self, app, sample_user_data):
+        """Test correctly signed tokens without an exp claim are rejected"""
+        token = jwt.encode({'email': sample_user_data['email']}, app.config['JWT_SECRET_KEY'], algorithm='HS256')
+        assert verify_jwt_token(token) is None
+    
+    def test_verify_jwt_token_edge_claims_use_pyjwt_rules(self, app, sample_user_data):
+        """Test nbf, aud and future iat claims are validated like PyJWT does"""
+        now = datetime.datetime.utcnow()
+        claims = {'email': sample_user_data['email'], 'exp': now + datetime.timedelta(hours=1)}
+        secret = app.config['JWT_SECRET_KEY']
+        not_yet_valid = jwt.encode({**claims, 'nbf': now + datetime.timedelta(minutes=5)}, secret, algorithm='HS256')
+        with_audience = jwt.encode({**claims, 'aud': 'another-service'}, secret, algorithm='HS256')
+        issued_later = jwt.encode({**claims, 'iat': now + datetime.timedelta(minutes=5)}, secret, algorithm='HS256')
+        already_valid = jwt.encode({**claims, 'nbf': now - datetime.timedelta(minutes=5)}, secret, algorithm='HS256')
+        
+        assert verify_jwt_token(not_yet_valid) is None
+        assert verify_jwt_token(with_audience) is None
+        assert verify_jwt_token(issued_later) is None
+        assert verify_jwt_token(already_valid)['email'] == sample_user_data['email']
+    
+    def test_jwt_token_eddsa(self, app, sample_user_data, monkeypatch):
+        """Test asymmetric signing uses the configured keypair"""
+        private_key = ed25519.Ed25519PrivateKey.generate()
+        private_pem = private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption()
+        ).decode()
+        public_pem = private_key.public_key().public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode()
+        monkeypatch.setitem(app.config, 'JWT_ALGORITHM', 'EdDSA')
+        monkeypatch.setitem(app.config, 'JWT_PRIVATE_KEY', private_pem)
+        monkeypatch.setitem(app.config, 'JWT_PUBLIC_KEY', public_pem)
+        init_auth(app)
+        
+        token = generate_jwt_token(sample_user_data)
+        assert jwt.get_unverified_header(token)['alg'] == 'EdDSA'
+        assert verify_jwt_token(token)['email'] == sample_user_data['email']
+    
+    def test_init_auth_snapshots_config(self, app, sample_user_data, monkeypatch):
+        """Test tokens use the settings captured by init_auth until it runs again"""
+        monkeypatch.setitem(app.config, 'JWT_EXPIRATION_HOURS', 1)
+        payload = jwt.decode(generate_jwt_token(sample_user_data), options={'verify_signature': False})
+        assert payload['exp'] - payload['iat'] == 24 * 3600
+        
+        init_auth(app)
+        payload = jwt.decode(generate_jwt_token(sample_user_data), options={'verify_signature': False})
+        assert payload['exp'] - payload['iat'] == 3600
+    
+    def test_verify_jwt_token_cached(self, app, valid_jwt_token):
+        """Test repeated verification of the same token is served from cache"""
+        clear_token_cache()
+        token = valid_jwt_token
+        first = verify_jwt_token(token)
+        
+        with patch('auth.auth_utils._decode_token') as mock_decode:
+            second = verify_jwt_token(token)
+            mock_decode.assert_not_called()
+        
+        assert second == first
+        assert second is not first
+    
+    def test_verify_jwt_token_cache_isolated_from_callers(self, app, valid_jwt_token):
+        """Test changes a caller makes to its payload don't reach later cache hits"""
+        clear_token_cache()
+        first = verify_jwt_token(valid_jwt_token)
+        first['email'] = 'changed@example.com'
+        verify_jwt_token(valid_jwt_token).pop('user_id')
+        
+        payload = verify_jwt_token(valid_jwt_token)
+        assert payload['email'] == 'test.user@example.com'
+        assert 'user_id' in payload
+    
+    def test_verify_jwt_token_cache_expires(self, app, valid_jwt_token):
+        """Test cached payloads are evicted once the token expires"""
+        clear_token_cache()
+        token = valid_jwt_token
+        payload = verify_jwt_token(token)
+        
+        with patch('auth.auth_utils.time.time', return_value=payload['exp'] + 1), \
+             patch('auth.auth_utils._decode_token', side_effect=jwt.ExpiredSignatureError) as mock_decode:
+            assert verify_jwt_token(token) is None
+            mock_decode.assert_called_once()
+
+# Request auth lookups: (lookup, header, header value with {token}, expected email or None)
+AUTH_SOURCE_CASES = [
+    pytest.param(get_user_from_cookie, 'Cookie', 'auth_token={token}', 'test.user@example.com', id='cookie-valid'),
+    pytest.param(get_user_from_cookie, 'Cookie', 'auth_token=invalid_token', None, id='cookie-invalid'),
+    pytest.param(get_user_from_cookie, None, None, None, id='cookie-missing'),
+    pytest.param(get_user_from_header, 'Authorization', 'Bearer {token}', 'test.user@example.com', id='header-valid'),
+    pytest.param(get_user_from_header, 'Authorization', 'InvalidFormat token', None, id='header-invalid-format'),
+    pytest.param(get_user_from_header, 'Authorization', 'Bearer invalid_token', None, id='header-invalid-token'),
+    pytest.param(get_user_from_header, None, None, None, id='header-missing'),
+]
+
+@pytest.mark.parametrize('lookup,header,value,expected_email', AUTH_SOURCE_CASES)
+def test_get_user_from_request(app, valid_jwt_token, lookup, header, value, expected_email):
+    """Test cookie and Authorization header lookups with valid, invalid and missing tokens"""
+    headers = {header: value.format(token=valid_jwt_token)} if header else {}
+    with app.test_request_context('/', headers=headers):
+        user = lookup()
+    if expected_email is None:
+        assert user is None
+    else:
+        assert user['email'] == expected_email
 
 class TestCookieAuth:
     """Test cookie-based authentication functions"""
     
-    def test_get_user_from_cookie_valid(self, app, valid_jwt_token):
-        """Test getting user from valid cookie"""
+    def test_get_user_from_cookie_cached_per_request(self, app, valid_jwt_token):
+        """Test the cookie token is verified once per request"""
         with app.test_request_context('/', headers={'Cookie': f'auth_token={valid_jwt_token}'}):
-            user = get_user_from_cookie()
-            assert user is not None
-            assert user['email'] == 'test.user@example.com'
-    
-    def test_get_user_from_cookie_invalid(self, app):
-        """Test getting user from invalid cookie"""
-        with app.test_request_context('/', headers={'Cookie': 'auth_token=invalid_token'}):
-            user = get_user_from_cookie()
-            assert user is None
-    
-    def test_get_user_from_cookie_missing(self, app):
-        """Test getting user when cookie is missing"""
-        with app.test_request_context('/'):
-            user = get_user_from_cookie()
-            assert user is None
+            with patch('auth.auth_utils.verify_jwt_token', return_value={'email': 'test.user@example.com'}) as mock_verify:
+                assert get_user_from_cookie() == get_user_from_cookie()
+            mock_verify.assert_called_once_with(valid_jwt_token)
+    
+    def test_get_user_from_cookie_cache_keyed_by_token(self, app, valid_jwt_token):
+        """Test a reused app context doesn't return the previous token's user"""
+        with app.app_context():
+            with app.test_request_context('/', headers={'Cookie': f'auth_token={valid_jwt_token}'}):
+                assert get_user_from_cookie() is not None
+            with app.test_request_context('/', headers={'Cookie': 'auth_token=invalid_token'}):
+                assert get_user_from_cookie() is None
 
 class TestHeaderAuth:
     """Test header-based authentication functions"""
     
-    def test_get_user_from_header_valid(self, app, valid_jwt_token):
-        """Test getting user from valid Authorization header"""
-        with app.test_request_context('/', headers={'Authorization': f'Bearer {valid_jwt_token}'}):
-            user = get_user_from_header()
-            assert user is not None
-            assert user['email'] == 'test.user@example.com'
+    @pytest.fixture
+    def gateway_auth(self, app, sample_user_data, monkeypatch):
+        """Enable gateway trust and return (token Kong has verified, headers Kong would forward)"""
+        monkeypatch.setitem(app.config, 'TRUST_GATEWAY_AUTH', True)
+        monkeypatch.setitem(app.config, 'GATEWAY_AUTH_SECRET', 'kong-shared-secret')
+        init_auth(app)
+        email = sample_user_data['email']
+        token = jwt.encode(
+            {'email': email, 'iss': email, 'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=1)},
+            'key-only-kong-knows',
+            algorithm='HS256'
+        )
+        headers = {
+            'Authorization': f'Bearer {token}',
+            'X-Consumer-Username': email,
+            'X-Credential-Identifier': email,
+            'X-Gateway-Secret': 'kong-shared-secret'
+        }
+        return token, headers
     
-    def test_get_user_from_header_invalid_format(self, app):
-        """Test getting user from invalid header format"""
-        with app.test_request_context('/', headers={'Authorization': 'InvalidFormat token'}):
+    def test_get_user_from_header_gateway_verified(self, app, sample_user_data, gateway_auth):
+        """Test Kong-verified tokens are trusted without re-checking the signature"""
+        token, headers = gateway_auth
+        with app.test_request_context('/', headers=headers):
             user = get_user_from_header()
-            assert user is None
+            assert user is not None
+            assert user['email'] == sample_user_data['email']
     
-    def test_get_user_from_header_missing(self, app):
-        """Test getting user when header is missing"""
-        with app.test_request_context('/'):
-            user = get_user_from_header()
-            assert user is None
+    @pytest.mark.parametrize('header,value', [
+        ('X-Consumer-Username', 'someone.else@example.com'),  # Token for another consumer
+        ('X-Gateway-Secret', None),  # Sent straight to Flask, bypassing Kong
+        ('X-Gateway-Secret', 'guessed-secret'),
+        ('X-Credential-Identifier', 'key-auth-credential-id'),  # Kong authenticated an API key, not the token
+        ('X-Credential-Identifier', None),
+    ])
+    def test_get_user_from_header_gateway_untrusted(self, app, gateway_auth, header, value):
+        """Test gateway headers that don't prove Kong verified this token fall back to full verification"""
+        token, headers = gateway_auth
+        headers = {k: v for k, v in headers.items() if k != header}
+        if value is not None:
+            headers[header] = value
+        with app.test_request_context('/', headers=headers):
+            assert get_user_from_header() is None
     
-    def test_get_user_from_header_invalid_token(self, app):
-        """Test getting user from header with invalid token"""
-        with app.test_request_context('/', headers={'Authorization': 'Bearer invalid_token'}):
-            user = get_user_from_header()
-            assert user is None
+    def test_gateway_trust_requires_secret(self, app, monkeypatch):
+        """Test TRUST_GATEWAY_AUTH without GATEWAY_AUTH_SECRET is refused at init_auth"""
+        monkeypatch.setitem(app.config, 'TRUST_GATEWAY_AUTH', True)
+        monkeypatch.setitem(app.config, 'GATEWAY_AUTH_SECRET', None)
+        with pytest.raises(RuntimeError):
+            init_auth(app)
@@ -0,0 +1,88 @@
+"""
+Unit tests for configuration loading
+"""
+
+import os
+import sys
+import types
+import pytest
+from unittest.mock import patch
+
+@pytest.fixture
+def config_module(app):
+    """The src config package (importing the app puts src ahead of the repo root config.py)"""
+    import config.config
+    return config.config
+
+class TestEnvCache:
+    """Test the compiled .env cache used in production"""
+    
+    def test_write_env_cache(self, app, tmp_path):
+        """Test .env values are written as an importable ENV dict"""
+        from config.env_cache import write_env_cache
+        env_file = tmp_path / '.env'
+        env_file.write_text('SECRET_KEY=abc\nKONG_ADMIN_URL="http://kong:8001"\n')
+        cache_file = tmp_path / '_compiled_env.py'
+        
+        write_env_cache(str(env_file), str(cache_file))
+        
+        namespace = {}
+        exec(cache_file.read_text(), namespace)
+        assert namespace['ENV'] == {'SECRET_KEY': 'abc', 'KONG_ADMIN_URL': 'http://kong:8001'}
+    
+    def test_production_uses_compiled_cache(self, config_module, monkeypatch):
+        """Test production loads the compiled values without parsing .env"""
+        monkeypatch.setenv('FLASK_ENV', 'production')
+        monkeypatch.delenv('SBOM_TEST_CACHED', raising=False)
+        monkeypatch.setitem(sys.modules, 'config._compiled_env', types.SimpleNamespace(ENV={'SBOM_TEST_CACHED': '1'}))
+        
+        with patch('dotenv.load_dotenv') as mock_load_dotenv:
+            config_module.load_env()
+        
+        mock_load_dotenv.assert_not_called()
+        assert os.environ['SBOM_TEST_CACHED'] == '1'
+    
+    def test_environment_overrides_cache(self, config_module, monkeypatch):
+        """Test variables already in the environment win over cached values"""
+        monkeypatch.setenv('FLASK_ENV', 'production')
+        monkeypatch.setenv('SBOM_TEST_CACHED', 'from-env')
+        monkeypatch.setitem(sys.modules, 'config._compiled_env', types.SimpleNamespace(ENV={'SBOM_TEST_CACHED': '1'}))
+        
+        config_module.load_env()
+        
+        assert os.environ['SBOM_TEST_CACHED'] == 'from-env'
+
+
+class TestLazyConfig:
+    """Test configuration classes are built on first access"""
+    
+    def test_env_loaded_on_first_access(self, config_module, monkeypatch):
+        """Test .env is read when the config is first used, and only once"""
+        for name in config_module._LAZY_NAMES:
+            monkeypatch.delattr(config_module, name, raising=False)
+        
+        with patch.object(config_module, 'load_env') as mock_load_env:
+            development = config_module.config['development']
+            assert isinstance(development, config_module.DevelopmentConfig)
+            assert development.ENV == 'development'
+        
+        mock_load_env.assert_called_once()
+    
+    def test_config_is_frozen(self, config_module):
+        """Test settings can't be changed after startup and load into Flask"""
+        from dataclasses import FrozenInstanceError
+        from flask import Config as FlaskConfig
+        
+        production = config_module.config['production']
+        with pytest.raises(FrozenInstanceError):
+            production.DEBUG = True
+        
+        flask_config = FlaskConfig('.')
+        flask_config.from_object(production)
+        assert flask_config['ENV'] == 'production'
+        assert flask_config['KONG_ADMIN_POOL_MAXSIZE'] == production.KONG_ADMIN_POOL_MAXSIZE
+    
+    def test_unknown_attribute(self, config_module):
+        """Test other missing names still raise AttributeError"""
+        with pytest.raises(AttributeError):
+            config_module.NOT_A_SETTING
@@ -3,129 +3,400 @@ Unit tests for Kong Admin API
 """
 
 import pytest
+import time
+import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
 from unittest.mock import Mock, patch
-from kong.kong_admin_api import KongAdminAPI, KongAdminAPIError
+from urllib.parse import parse_qs, urlsplit
+from kong.kong_admin_api import KongAdminAPI, KongAdminAPIError, KongServiceManager, get_kong_api
+
+# Kong response bodies shared across tests - read-only so no test can alter another's
+CONSUMER_BODY = MappingProxyType({"id": "consumer_123", "username": "test@example.com", "custom_id": "test_user"})
+KEY_BODY = MappingProxyType({"id": "key_123", "key": "api_key_abcdef123456"})
+
+# Successful calls: (method, args, kwargs, HTTP method, Admin API path, Kong status, Kong body)
+SUCCESS_CASES = [
+    ("health_check", (), {}, "GET", "/status", 200, {"database": {"reachable": True}}),  # Kong status format
+    ("create_consumer", (), {"username": "test@example.com", "custom_id": "test_user", "tags": ["free"]},
+     "POST", "/consumers", 201, CONSUMER_BODY),
+    ("get_consumer", ("test@example.com",), {}, "GET", "/consumers/test%40example.com", 200, CONSUMER_BODY),
+    ("create_consumer_key", ("test@example.com",), {}, "POST", "/consumers/test%40example.com/key-auth", 201,
+     KEY_BODY),
+    ("get_consumer_jwts", ("test@example.com",), {"size": 1}, "GET", "/consumers/test%40example.com/jwt", 200,
+     {"data": [], "next": None}),
+]
+
+@pytest.fixture(scope='module')
+def shared_kong():
+    """One client for the module, so each test doesn't build a session and pool"""
+    kong = KongAdminAPI("http://localhost:8001")
+    yield kong
+    kong.session.close()
+
+@pytest.fixture
+def kong(shared_kong):
+    """The module's client, with no consumer_exists results cached from earlier tests"""
+    shared_kong._exists_cache.clear()
+    return shared_kong
 
 class TestKongAdminAPI:
     """Test Kong Admin API functionality"""
     
-    def test_init(self):
+    def test_init(self, kong):
         """Test KongAdminAPI initialization"""
-        kong = KongAdminAPI("http://localhost:8001")
         assert kong.base_url == "http://localhost:8001"
     
-    def test_health_check_success(self):
-        """Test successful health check"""
+    def test_init_pool_size(self):
+        """Test the keep-alive pool size is configurable"""
+        kong = KongAdminAPI("http://localhost:8001", pool_maxsize=8)
+        assert kong.session.get_adapter("http://localhost:8001")._pool_maxsize == 8
+        
         kong = KongAdminAPI("http://localhost:8001")
+        assert kong.session.get_adapter("http://localhost:8001")._pool_maxsize == KongAdminAPI.POOL_MAXSIZE
+    
+    def test_init_shared_session(self, requests_mock):
+        """Test an injected session is reused without changing its defaults"""
+        shared = requests.Session()
+        kong = KongAdminAPI("http://localhost:8001", session=shared)
+        assert kong.session is shared
+        assert 'KongAdminAPI-Client' not in shared.headers['User-Agent']
         
-        with patch.object(kong.session, 'request') as mock_request:
-            mock_response = Mock()
-            mock_response.json.return_value = {"database": {"reachable": True}}  # Kong status format
-            mock_response.status_code = 200
-            mock_request.return_value = mock_response
-            
-            response, status = kong.health_check()
-            
-            assert status == 200
-            assert "database" in response
+        requests_mock.get("http://localhost:8001/status", json={"database": {"reachable": True}})
+        
+        kong.health_check()
+        
+        assert requests_mock.last_request.headers['Content-Type'] == 'application/json'
     
-    def test_create_consumer_success(self):
-        """Test successful consumer creation"""
-        kong = KongAdminAPI("http://localhost:8001")
+    def test_max_concurrency(self):
+        """Test requests run in parallel up to max_concurrency, and never past it"""
+        kong = KongAdminAPI("http://localhost:8001", max_concurrency=2)
+        in_flight = []
+        peak = []
+        lock = threading.Lock()
+        both_in_flight = threading.Event()
         
-        # Mock the session.request method directly
-        with patch.object(kong.session, 'request') as mock_request:
-            mock_response = Mock()
-            mock_response.json.return_value = {
-                "id": "consumer_123",
-                "username": "test@example.com",
-                "custom_id": "test_user"
-            }
-            mock_response.status_code = 201
-            mock_request.return_value = mock_response
-            
-            response, status = kong.create_consumer(
-                username="test@example.com", 
-                custom_id="test_user",
-                tags=["free"]
-            )
-            
-            assert status == 201
-            assert response["username"] == "test@example.com"
-            assert response["custom_id"] == "test_user"
+        def slow_request(**kwargs):
+            with lock:
+                in_flight.append(1)
+                peak.append(len(in_flight))
+                if len(in_flight) == 2:
+                    both_in_flight.set()
+            # Hold the slot until a second request runs alongside (times out if calls are serialized)
+            both_in_flight.wait(timeout=1)
+            time.sleep(0.02)
+            with lock:
+                in_flight.pop()
+            return Mock(status_code=200, content=b'{}')
+        
+        # Stubbed below requests-mock, which serializes every mocked send behind one lock
+        with patch.object(kong.session, 'request', side_effect=slow_request), \
+             ThreadPoolExecutor(max_workers=6) as pool:
+            list(pool.map(lambda _: kong.health_check(), range(6)))
+        
+        assert len(peak) == 6
+        assert max(peak) == 2
     
-    def test_get_consumer_success(self):
-        """Test successful consumer retrieval"""
-        kong = KongAdminAPI("http://localhost:8001")
+    @pytest.mark.parametrize("method,args,kwargs,http_method,path,status,body", SUCCESS_CASES,
+                             ids=[case[0] for case in SUCCESS_CASES])
+    def test_request_success(self, kong, requests_mock, method, args, kwargs, http_method, path, status, body):
+        """Test successful calls hit the right endpoint and return Kong's parsed body and status"""
+        endpoint = requests_mock.register_uri(http_method, "http://localhost:8001" + path, json=dict(body), status_code=status)
         
-        with patch.object(kong.session, 'request') as mock_request:
-            mock_response = Mock()
-            mock_response.json.return_value = {
-                "id": "consumer_123",
-                "username": "test@example.com"
-            }
-            mock_response.status_code = 200
-            mock_request.return_value = mock_response
-            
-            response, status = kong.get_consumer("test@example.com")
-            
-            assert status == 200
-            assert response["username"] == "test@example.com"
+        response, response_status = getattr(kong, method)(*args, **kwargs)
+        
+        assert endpoint.call_count == 1
+        assert response_status == status
+        assert response == body
     
-    def test_get_consumer_not_found(self):
+    def test_get_consumer_not_found(self, kong, requests_mock):
         """Test consumer not found"""
-        kong = KongAdminAPI("http://localhost:8001")
+        requests_mock.get("http://localhost:8001/consumers/nonexistent%40example.com",
+                          json={"message": "Not found"}, status_code=404)
         
-        with patch.object(kong.session, 'request') as mock_request:
-            mock_response = Mock()
-            mock_response.json.return_value = {"message": "Not found"}
-            mock_response.status_code = 404
-            mock_request.return_value = mock_response
-            
-            with pytest.raises(KongAdminAPIError) as exc_info:
-                kong.get_consumer("nonexistent@example.com")
-            
-            assert exc_info.value.status_code == 404
+        with pytest.raises(KongAdminAPIError) as exc_info:
+            kong.get_consumer("nonexistent@example.com")
+        
+        assert exc_info.value.status_code == 404
     
-    def test_create_consumer_key_success(self):
-        """Test successful API key creation"""
-        kong = KongAdminAPI("http://localhost:8001")
+    def test_delete_consumer_no_content(self, kong, requests_mock):
+        """Test 204 responses return a fresh empty dict without parsing"""
+        requests_mock.delete("http://localhost:8001/consumers/test%40example.com", status_code=204)
         
-        with patch.object(kong.session, 'request') as mock_request:
-            mock_response = Mock()
-            mock_response.json.return_value = {
-                "id": "key_123",
-                "key": "api_key_abcdef123456"
-            }
-            mock_response.status_code = 201
-            mock_request.return_value = mock_response
-            
-            response, status = kong.create_consumer_key("test@example.com")
-            
-            assert status == 201
-            assert "key" in response
-            # Don't assert specific ID since Kong might generate UUIDs
+        response, status = kong.delete_consumer("test@example.com")
+        
+        assert status == 204
+        assert response == {}
+        response['id'] = 'caller_owned'  # A plain dict per call, safe to update or serialize
+        assert kong.delete_consumer("test@example.com")[0] == {}
     
-    def test_consumer_exists_true(self):
-        """Test consumer_exists returns True for existing consumer"""
-        kong = KongAdminAPI("http://localhost:8001")
+    def test_upsert_consumer_uses_put(self, kong, requests_mock):
+        """Test upsert_consumer issues a single PUT keyed by username"""
+        requests_mock.put("http://localhost:8001/consumers/test%40example.com", json=dict(CONSUMER_BODY))
+        
+        response, status = kong.upsert_consumer("test@example.com", custom_id="test_user", tags=["free"])
+        
+        assert status == 200
+        assert response == CONSUMER_BODY
+        assert requests_mock.call_count == 1
+        assert requests_mock.last_request.method == 'PUT'
+        assert requests_mock.last_request.json() == {"custom_id": "test_user", "tags": ["free"]}
+    
+    def test_ensure_consumer_creates_missing(self, kong, requests_mock):
+        """Test ensure_consumer creates a new consumer with custom_id and tags in one POST"""
+        create = requests_mock.post("http://localhost:8001/consumers", json=dict(CONSUMER_BODY), status_code=201)
+        
+        response, status = kong.ensure_consumer("test@example.com", custom_id="test_user", tags=["free"])
+        
+        assert status == 201
+        assert response == CONSUMER_BODY
+        assert requests_mock.call_count == 1
+        assert create.last_request.json() == {"username": "test@example.com", "custom_id": "test_user", "tags": ["free"]}
+    
+    def test_ensure_consumer_returns_existing(self, kong, requests_mock):
+        """Test a 409 on create fetches the existing consumer without changing it"""
+        requests_mock.post("http://localhost:8001/consumers", json={"message": "UNIQUE violation detected"}, status_code=409)
+        requests_mock.get("http://localhost:8001/consumers/test%40example.com", json=dict(CONSUMER_BODY))
         
+        response, status = kong.ensure_consumer("test@example.com", custom_id="test_user", tags=["free"])
+        
+        assert status == 200
+        assert response == CONSUMER_BODY
+        assert [r.method for r in requests_mock.request_history] == ['POST', 'GET']
+    
+    def test_extract_error_message(self, kong):
+        """Test Kong error messages are prefixed by status and content"""
+        assert kong._extract_error_message({"message": "username is required"}, 400) == "Missing required field: username is required"
+        assert kong._extract_error_message({"message": "Invalid UUID"}, 400) == "Invalid data provided: Invalid UUID"
+        assert kong._extract_error_message({"message": "invalid: name REQUIRED"}, 400) == "Missing required field: invalid: name REQUIRED"
+        assert kong._extract_error_message({"message": "schema violation"}, 400) == "Bad request: schema violation"
+        assert kong._extract_error_message({"message": "Not found"}, 404) == "Resource not found: Not found"
+        assert kong._extract_error_message({"message": "UNIQUE violation detected"}, 409) == "Duplicate resource: UNIQUE violation detected"
+        assert kong._extract_error_message({}, 409) == "Conflict: HTTP 409 error"
+        assert kong._extract_error_message({"message": "Server error"}, 500) == "Server error"
+    
+    def test_list_consumers_passes_params(self, kong, requests_mock):
+        """Test pagination is sent as query params so offsets get URL-encoded"""
+        requests_mock.get("http://localhost:8001/consumers", json={"data": [], "next": None})
+        
+        kong.list_consumers(size=10, offset="WyJhYiIsImNkIl0+/=")
+        
+        url = urlsplit(requests_mock.last_request.url)
+        assert url.path == "/consumers"
+        assert parse_qs(url.query) == {'size': ['10'], 'offset': ["WyJhYiIsImNkIl0+/="]}
+    
+    def test_iter_consumers_follows_offsets(self, kong):
+        """Test iter_consumers walks every page via Kong's offset"""
+        pages = [
+            ({"data": [{"id": "c1"}, {"id": "c2"}], "offset": "page2"}, 200),
+            ({"data": [{"id": "c3"}], "offset": None}, 200),
+        ]
+        
+        with patch.object(kong, '_make_request', side_effect=pages) as mock_request:
+            consumers = list(kong.iter_consumers(size=2))
+        
+        assert [c["id"] for c in consumers] == ["c1", "c2", "c3"]
+        assert mock_request.call_args_list[1].kwargs['params'] == {'size': 2, 'offset': 'page2'}
+    
+    def test_iter_consumers_tags_filter(self, kong):
+        """Test iter_consumers asks Kong for consumers with all the given tags on every page"""
+        pages = [
+            ({"data": [{"id": "c1"}], "offset": "page2"}, 200),
+            ({"data": [{"id": "c2"}], "offset": None}, 200),
+        ]
+        
+        with patch.object(kong, '_make_request', side_effect=pages) as mock_request:
+            consumers = list(kong.iter_consumers(size=1, tags=["sbom-saas", "oauth-user"]))
+        
+        assert [c["id"] for c in consumers] == ["c1", "c2"]
+        assert mock_request.call_args_list[0].kwargs['params'] == {'size': 1, 'tags': 'sbom-saas,oauth-user'}
+        assert mock_request.call_args_list[1].kwargs['params'] == {'size': 1, 'offset': 'page2', 'tags': 'sbom-saas,oauth-user'}
+    
+    def test_consumer_exists_true(self, kong):
+        """Test consumer_exists returns True for existing consumer"""
         with patch.object(kong, 'get_consumer') as mock_get:
             mock_get.return_value = ({"id": "consumer_123"}, 200)
             
             exists = kong.consumer_exists("test@example.com")
             assert exists is True
     
-    def test_consumer_exists_false(self):
+    def test_consumer_exists_false(self, kong):
         """Test consumer_exists returns False for non-existing consumer"""
-        kong = KongAdminAPI("http://localhost:8001")
-        
         with patch.object(kong, 'get_consumer') as mock_get:
             mock_get.side_effect = KongAdminAPIError("Not found", 404, {})
             
             exists = kong.consumer_exists("test@example.com")
             assert exists is False
 
+    def test_map_concurrent_preserves_order(self, kong):
+        """Test map_concurrent returns results in input order with errors in place"""
+        def delete(username):
+            if username == "missing@example.com":
+                raise KongAdminAPIError("Not found", 404, {})
+            return {}, 204
+        
+        usernames = ["a@example.com", "missing@example.com", "b@example.com"]
+        with patch.object(kong, 'delete_consumer', side_effect=delete):
+            results = kong.map_concurrent(kong.delete_consumer, usernames)
+        
+        assert results[0] == ({}, 204)
+        assert isinstance(results[1], KongAdminAPIError)
+        assert results[1].status_code == 404
+        assert results[2] == ({}, 204)
+
+    def test_consumer_exists_cached(self, kong):
+        """Test repeat consumer_exists checks are served from cache until invalidated"""
+        with patch.object(kong, 'get_consumer') as mock_get, \
+             patch.object(kong, '_make_request', return_value=({}, 204)):
+            mock_get.return_value = ({"id": "consumer_123"}, 200)
+            
+            assert kong.consumer_exists("test@example.com") is True
+            assert kong.consumer_exists("test@example.com") is True
+            assert mock_get.call_count == 1
+            
+            kong.delete_consumer("test@example.com")
+            mock_get.side_effect = KongAdminAPIError("Not found", 404, {})
+            
+            assert kong.consumer_exists("test@example.com") is False
+            assert mock_get.call_count == 2
+    
+    def test_consumer_exists_invalidated_by_uuid(self, kong, requests_mock):
+        """Test creating a consumer drops a cached answer for its UUID too"""
+        requests_mock.get("http://localhost:8001/consumers/consumer_123",
+                          json={"message": "Not found"}, status_code=404)
+        assert kong.consumer_exists("consumer_123") is False
+        
+        requests_mock.post("http://localhost:8001/consumers", json=dict(CONSUMER_BODY), status_code=201)
+        kong.create_consumer("test@example.com")
+        requests_mock.get("http://localhost:8001/consumers/consumer_123", json=dict(CONSUMER_BODY))
+        
+        assert kong.consumer_exists("consumer_123") is True
+    
+    def test_consumer_exists_not_cached_across_write(self, kong, requests_mock):
+        """Test a lookup that overlaps a delete doesn't re-cache the pre-delete answer"""
+        def delete_during_lookup(request, context):
+            kong.delete_consumer("test@example.com")  # Lands while the GET is in flight
+            return dict(CONSUMER_BODY)
+        
+        requests_mock.get("http://localhost:8001/consumers/test%40example.com", [
+            {"json": delete_during_lookup},
+            {"json": {"message": "Not found"}, "status_code": 404},
+        ])
+        requests_mock.delete("http://localhost:8001/consumers/test%40example.com", status_code=204)
+        
+        assert kong.consumer_exists("test@example.com") is True
+        assert kong.consumer_exists("test@example.com") is False
+    
+    def test_consumer_exists_cache_expires(self, kong):
+        """Test cached consumer_exists results expire after the TTL"""
+        with patch.object(kong, 'get_consumer') as mock_get, \
+             patch('kong.kong_admin_api.time.monotonic') as mock_clock:
+            mock_get.return_value = ({"id": "consumer_123"}, 200)
+            mock_clock.return_value = 1000.0
+            kong.consumer_exists("test@example.com")
+            
+            mock_clock.return_value = 1000.0 + kong.EXISTS_CACHE_TTL
+            kong.consumer_exists("test@example.com")
+            
+            assert mock_get.call_count == 2
+
+@pytest.fixture
+def kong_registry():
+    """Empty process-wide client registry for the test, restored (and new clients closed) afterwards"""
+    with patch.dict('kong.kong_admin_api._kong_clients', clear=True) as registry:
+        yield registry
+        for client in registry.values():
+            client.session.close()
+
+@pytest.mark.usefixtures('kong_registry')
+class TestGetKongApi:
+    """Test the shared Kong client"""
+    
+    def test_get_kong_api_reuses_client(self):
+        """Test one client (and connection pool) is shared per base URL"""
+        kong = get_kong_api("http://localhost:8001")
+        
+        assert get_kong_api("http://localhost:8001/") is kong
+        assert get_kong_api("http://kong-admin:8001") is not kong
+        assert KongServiceManager("http://localhost:8001").kong_api is kong
+    
+    def test_get_kong_api_warns_on_conflicting_options(self, caplog):
+        """Test options that differ from the existing client's are reported, not silently dropped"""
+        kong = get_kong_api("http://localhost:8001", pool_maxsize=8, max_concurrency=4)
+        
+        with caplog.at_level('WARNING', logger='kong.kong_admin_api'):
+            assert get_kong_api("http://localhost:8001", pool_maxsize=8) is kong
+            assert get_kong_api("http://localhost:8001", max_concurrency=None) is kong
+            assert not caplog.records
+            
+            assert get_kong_api("http://localhost:8001", max_concurrency=16, timeout=5) is kong
+        
+        assert len(caplog.records) == 1
+        assert 'max_concurrency, timeout' in caplog.records[0].getMessage()
+
+class TestKongServiceManager:
+    """Test KongServiceManager bulk operations"""
+    
+    def test_provision_many(self):
+        """Test bulk provisioning returns one result per user in order"""
+        manager = KongServiceManager("http://localhost:8001")
+        users = [("1", "alice", "alice@example.com"), ("2", "bob", "bob@example.com")]
+        
+        with patch.object(manager.kong_api, 'create_consumer') as mock_create, \
+             patch.object(manager.kong_api, 'create_consumer_key') as mock_key:
+            mock_create.side_effect = lambda username, **kwargs: ({"id": f"consumer_{username}"}, 201)
+            mock_key.side_effect = lambda username: ({"key": f"key_{username}"}, 201)
+            
+            results = manager.provision_many(users)
+        
+        assert [r['consumer_id'] for r in results] == ["consumer_alice", "consumer_bob"]
+        assert [r['api_key'] for r in results] == ["key_alice", "key_bob"]
+        assert all(r['success'] for r in results)
+
+    def test_get_user_api_keys_all_pages(self):
+        """Test get_user_api_keys projects keys from every page"""
+        manager = KongServiceManager("http://localhost:8001")
+        pages = [
+            ({"data": [{"id": "k1", "key": "key_1", "consumer": {"id": "c1"}}], "offset": "page2"}, 200),
+            ({"data": [{"id": "k2", "key": "key_2", "created_at": 1723456700, "consumer": None}]}, 200),
+        ]
+        
+        with patch.object(manager.kong_api, '_make_request', side_effect=pages):
+            result = manager.get_user_api_keys("alice@example.com")
+        
+        assert result['success'] is True
+        assert result['count'] == 2
+        assert result['keys'][0] == {'id': 'k1', 'key': 'key_1', 'created_at': None, 'consumer_id': 'c1'}
+        assert result['keys'][1]['consumer_id'] is None
+
+    def test_cleanup_many(self):
+        """Test bulk cleanup reports a result per username"""
+        manager = KongServiceManager("http://localhost:8001")
+        
+        def delete(username):
+            if username == "missing@example.com":
+                raise KongAdminAPIError("Not found", 404, {})
+            return {}, 204
+        
+        with patch.object(manager.kong_api, 'delete_consumer', side_effect=delete):
+            results = manager.cleanup_many(["alice@example.com", "missing@example.com"])
+        
+        assert results["alice@example.com"]['success'] is True
+        assert results["missing@example.com"]['success'] is False
+        assert results["missing@example.com"]['status_code'] == 404
+
+    def test_revoke_keys_bulk(self):
+        """Test bulk revocation reports a result per key"""
+        manager = KongServiceManager("http://localhost:8001")
+        
+        with patch.object(manager.kong_api, 'delete_consumer_key', return_value=({}, 204)) as mock_delete:
+            results = manager.revoke_keys_bulk("alice", ["k1", "k2", "k3"])
+        
+        assert list(results) == ["k1", "k2", "k3"]
+        assert all(r['success'] for r in results.values())
+        assert mock_delete.call_count == 3
+
 class TestKongAdminAPIError:
     """Test KongAdminAPIError exception"""
     
@@ -137,3 +408,12 @@ class TestKongAdminAPIError:
         assert error.status_code == 400
         assert error.response_data == {"detail": "Bad request"}
         assert error.message == "Test error"
+    
+    def test_error_without_response_data(self):
+        """Test KongAdminAPIError defaults to its own empty response_data dict"""
+        error = KongAdminAPIError("Not found", 404)
+        
+        assert str(error) == "Kong API Error 404: Not found"
+        assert error.response_data == {}
+        error.response_data['hint'] = 'retry'  # Error handlers may annotate it
+        assert KongAdminAPIError("Not found", 404).response_data == {}
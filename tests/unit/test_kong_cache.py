@@ -0,0 +1,69 @@
+"""
+Unit tests for the Kong consumer cache
+"""
+
+import pytest
+from unittest.mock import Mock, patch
+from kong.kong_cache import ConsumerCache
+
+class TestConsumerCache:
+    """Test ConsumerCache behaviour"""
+    
+    def test_get_or_set_caches_value(self):
+        """Test a fresh value is served without fetching again"""
+        cache = ConsumerCache()
+        fetch = Mock(return_value="consumer_123")
+        
+        assert cache.get_or_set("test@example.com", fetch) == "consumer_123"
+        assert cache.get_or_set("test@example.com", fetch) == "consumer_123"
+        fetch.assert_called_once()
+    
+    def test_expired_value_is_refetched(self):
+        """Test values are refetched once their freshness lifetime passes"""
+        cache = ConsumerCache()
+        fetch = Mock(side_effect=["consumer_123", "consumer_456"])
+        
+        with patch('kong.kong_cache.time.monotonic') as mock_clock:
+            mock_clock.return_value = 1000.0
+            cache.get_or_set("test@example.com", fetch)
+            
+            mock_clock.return_value = 1000.0 + ConsumerCache.MIN_TTL + 2.0
+            assert cache.get_or_set("test@example.com", fetch) == "consumer_456"
+    
+    def test_stale_value_served_when_fetch_fails(self):
+        """Test the last known value is returned while Kong is unreachable"""
+        cache = ConsumerCache()
+        
+        with patch('kong.kong_cache.time.monotonic') as mock_clock:
+            mock_clock.return_value = 1000.0
+            cache.get_or_set("test@example.com", lambda: "consumer_123")
+            
+            mock_clock.return_value = 1000.0 + ConsumerCache.MAX_TTL + 1.0
+            assert cache.get_or_set("test@example.com", lambda: None) == "consumer_123"
+    
+    def test_failure_negatively_cached(self):
+        """Test failures without a previous value are retried only after NEGATIVE_TTL"""
+        cache = ConsumerCache()
+        fetch = Mock(return_value=None)
+        
+        with patch('kong.kong_cache.time.monotonic') as mock_clock:
+            mock_clock.return_value = 1000.0
+            assert cache.get_or_set("test@example.com", fetch) is None
+            assert cache.get_or_set("test@example.com", fetch) is None
+            assert fetch.call_count == 1
+            
+            mock_clock.return_value = 1000.0 + ConsumerCache.NEGATIVE_TTL
+            cache.get_or_set("test@example.com", fetch)
+            assert fetch.call_count == 2
+    
+    def test_lru_eviction(self):
+        """Test the least recently used key is evicted when full"""
+        cache = ConsumerCache(maxsize=2)
+        cache.get_or_set("a", lambda: 1)
+        cache.get_or_set("b", lambda: 2)
+        cache.get_or_set("a", lambda: 1)
+        cache.get_or_set("c", lambda: 3)
+        
+        fetch = Mock(return_value=2)
+        cache.get_or_set("b", fetch)
+        fetch.assert_called_once()
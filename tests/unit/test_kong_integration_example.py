@@ -0,0 +1,88 @@
+"""
+Unit tests for the Kong integration service layer
+"""
+
+import pytest
+from unittest.mock import patch
+from kong.kong_integration_example import UserAPIService
+from tests.fixtures.kong_mock import KONG_ADMIN_URL
+
+@pytest.fixture
+def api_service():
+    """UserAPIService with a mocked KongServiceManager"""
+    with patch('kong.kong_integration_example.KongServiceManager'):
+        service = UserAPIService("http://localhost:8001")
+        service.kong_service.provision_user_api_access.return_value = {
+            'success': True,
+            'api_key': 'key_abc',
+            'consumer_id': 'consumer_123'
+        }
+        yield service
+
+class TestSetupUserApiAccess:
+    """Test repeat setups are served from the in-memory map"""
+    
+    USER = {'user_id': 'google_1', 'email': 'alice@example.com', 'name': 'Alice'}
+    
+    def test_repeat_setup_skips_kong(self, api_service):
+        """Test a second login within the TTL makes no Kong calls"""
+        first = api_service.setup_user_api_access(self.USER)
+        second = api_service.setup_user_api_access(self.USER)
+        
+        assert first == second == {
+            'success': True, 'api_key': 'key_abc', 'consumer_id': 'consumer_123', 'username': 'alice'
+        }
+        api_service.kong_service.provision_user_api_access.assert_called_once()
+    
+    def test_failures_not_remembered(self, api_service):
+        """Test failed setups are retried on the next call"""
+        api_service.kong_service.provision_user_api_access.return_value = {'success': False, 'error': 'down'}
+        
+        api_service.setup_user_api_access(self.USER)
+        api_service.setup_user_api_access(self.USER)
+        
+        assert api_service.kong_service.provision_user_api_access.call_count == 2
+    
+    def test_expired_entry_refetched(self, api_service, monkeypatch):
+        """Test entries older than PROVISIONED_TTL are provisioned again"""
+        api_service.setup_user_api_access(self.USER)
+        monkeypatch.setattr(UserAPIService, 'PROVISIONED_TTL', 0)
+        api_service.setup_user_api_access(self.USER)
+        
+        assert api_service.kong_service.provision_user_api_access.call_count == 2
+    
+    def test_revoke_forgets_setup(self, api_service):
+        """Test revoking access makes the next login provision again"""
+        api_service.kong_service.cleanup_user_access.return_value = {'success': True}
+        
+        api_service.setup_user_api_access(self.USER)
+        api_service.revoke_user_access(self.USER['email'])
+        api_service.setup_user_api_access(self.USER)
+        
+        assert api_service.kong_service.provision_user_api_access.call_count == 2
+
+    def test_registers_revoke_listener(self, api_service):
+        """Test revokes made through kong_service directly also drop remembered setups"""
+        api_service.kong_service.add_revoke_listener.assert_called_once_with(api_service._forget_provisioned)
+
+class TestRevokePaths:
+    """Test keys revoked outside UserAPIService aren't served from the remembered setups"""
+    
+    USER = {'user_id': 'google_2', 'email': 'bob@example.com', 'name': 'Bob'}
+    
+    @pytest.mark.parametrize('revoke', [
+        lambda kong, username, key_ids: kong.revoke_keys_bulk(username, key_ids),
+        lambda kong, username, key_ids: kong.cleanup_many([username]),
+    ], ids=['revoke_keys_bulk', 'cleanup_many'])
+    def test_revoked_key_not_served(self, mocked_kong, revoke):
+        """Test a setup after a bulk revoke goes back to Kong instead of returning the old key"""
+        service = UserAPIService(KONG_ADMIN_URL)
+        first = service.setup_user_api_access(self.USER)
+        assert first['success']
+        
+        key_ids = [key_id for key_id, key in mocked_kong.keys.items() if key['key'] == first['api_key']]
+        revoke(service.kong_service, first['username'], key_ids)
+        second = service.setup_user_api_access(self.USER)
+        
+        assert second.get('api_key') != first['api_key']
+        assert len(mocked_kong.calls('POST')) > 2  # Provisioned again rather than served from memory
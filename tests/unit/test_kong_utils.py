@@ -0,0 +1,107 @@
+"""
+Unit tests for Kong utility functions
+"""
+
+import pytest
+import threading
+from unittest.mock import Mock, patch
+from kong.kong_admin_api import KongAdminAPIError
+from kong.kong_utils import email_to_kong_username, get_kong_api, get_user_api_keys, get_user_kong_info
+
+class TestEmailToKongUsername:
+    """Test email to Kong username conversion"""
+    
+    def test_simple_email(self):
+        """Test the local part is used as the username"""
+        assert email_to_kong_username('alice@example.com') == 'alice'
+    
+    def test_dots_and_plus_replaced(self):
+        """Test '.' and '+' in the local part become underscores"""
+        assert email_to_kong_username('test.user+tag@example.com') == 'test_user_tag'
+    
+    def test_domain_dots_ignored(self):
+        """Test only the local part is converted"""
+        assert email_to_kong_username('first.last@sub.example.co.uk') == 'first_last'
+
+
+class TestGetKongApi:
+    """Test the app-level Kong API instance"""
+    
+    def test_same_instance_across_calls(self, app):
+        """Test the client is built once and reused by every request"""
+        with app.app_context():
+            first = get_kong_api()
+        with app.app_context():
+            assert get_kong_api() is first
+        assert app.extensions['kong_api'] is first
+
+
+class TestGetUserKongInfo:
+    """Test the combined consumer and keys lookup"""
+    
+    @patch('kong.kong_utils.get_kong_api')
+    def test_consumer_and_keys_fetched_together(self, mock_get_api, app):
+        """Test the keys request is sent before the consumer response arrives"""
+        kong_api = mock_get_api.return_value
+        keys_requested = threading.Event()
+        
+        def get_consumer_keys(username):
+            keys_requested.set()
+            return {'data': [{'id': 'key_1', 'key': 'abc', 'consumer': {'id': 'consumer_1'}}]}, 200
+        kong_api.get_consumer_keys.side_effect = get_consumer_keys
+        
+        def get_consumer(username):
+            # Would time out if the keys request only started after this one returned
+            assert keys_requested.wait(timeout=2)
+            return {'id': 'consumer_1', 'username': 'alice'}, 200
+        kong_api.get_consumer.side_effect = get_consumer
+        
+        with app.app_context():
+            result = get_user_kong_info('alice@example.com')
+        
+        assert result['success'] is True
+        assert result['consumer']['id'] == 'consumer_1'
+        assert result['api_keys'][0]['consumer_id'] == 'consumer_1'
+        assert result['key_count'] == 1
+    
+    @patch('kong.kong_utils.get_kong_api')
+    def test_keys_failure_keeps_consumer(self, mock_get_api, app):
+        """Test a failed keys lookup still returns the consumer"""
+        kong_api = mock_get_api.return_value
+        kong_api.get_consumer.return_value = ({'id': 'consumer_1', 'username': 'alice'}, 200)
+        kong_api.get_consumer_keys.side_effect = KongAdminAPIError("boom", 500)
+        
+        with app.app_context():
+            result = get_user_kong_info('alice@example.com')
+        
+        assert result['success'] is True
+        assert result['api_keys'] == []
+        assert result['key_count'] == 0
+
+class TestKongCall:
+    """Test the shared Kong error handling"""
+    
+    @patch('kong.kong_utils.get_kong_api')
+    def test_kong_error_becomes_error_result(self, mock_get_api, app):
+        """Test a Kong API error is returned with the helper's default fields"""
+        mock_get_api.return_value.get_consumer_keys.side_effect = KongAdminAPIError("boom", 500)
+        with app.app_context():
+            result = get_user_api_keys('alice@example.com')
+        assert result == {'success': False, 'error': 'Kong API error: boom', 'keys': []}
+    
+    @patch('kong.kong_utils.get_kong_api')
+    def test_unexpected_error_is_internal_error(self, mock_get_api, app):
+        """Test unexpected exceptions are not leaked to the caller"""
+        mock_get_api.side_effect = RuntimeError("connection refused")
+        with app.app_context():
+            result = get_user_kong_info('alice@example.com')
+        assert result == {'success': False, 'error': 'Internal error', 'consumer': None, 'api_keys': []}
+    
+    @patch('kong.kong_utils.get_kong_api')
+    def test_not_found_message(self, mock_get_api, app):
+        """Test a 404 from Kong maps to the helper's not-found message"""
+        mock_get_api.return_value.get_consumer.side_effect = KongAdminAPIError("Not found", 404)
+        with app.app_context():
+            result = get_user_kong_info('alice@example.com')
+        assert result['error'] == 'User not found in Kong'
+        assert result['consumer'] is None